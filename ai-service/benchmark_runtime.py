@@ -0,0 +1,174 @@
+"""
+Runtime Settings Benchmark
+Sweeps TensorFlow thread pools, oneDNN and CPU affinity (the runtime_config.py
+environment variables) and reports p50/p99 latency and throughput of one crop
+model under concurrent load, to pick the settings for a node type
+
+Each combination runs in a fresh process, since oneDNN and the thread pools
+are fixed once TensorFlow has started.
+
+Usage:
+    python benchmark_runtime.py --crop rice --intra 1 2 4 --inter 1 2 --concurrency 1 4
+    python benchmark_runtime.py --backend tflite --backend-threads 1 2 --onednn 0 1
+    python benchmark_runtime.py --cpus 0-1 0-3 --output runtime_benchmark.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import subprocess
+import threading
+
+import runtime_config
+
+IMAGE_SIZE = (224, 224)
+# The child prints its result on one line with this prefix; TensorFlow logs go around it
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+
+def run_one(args):
+    """Child process: load the model with the environment's settings and time concurrent requests"""
+    settings = runtime_config.runtime_settings()
+    runtime_config.apply_process_settings(settings)
+
+    import numpy as np
+    from tensorflow import keras
+    from inference_backends import load_backends, with_uint8_input
+    from inference_batcher import latency_summary
+    from export_models import MODEL_PATHS
+
+    runtime_config.configure_tensorflow(settings)
+
+    model_path = MODEL_PATHS[args.crop]
+    model = keras.models.load_model(model_path)
+    backends, skipped = load_backends(
+        args.crop, with_uint8_input(model), model_path, ("keras", args.backend),
+        pool_size=args.concurrency, num_threads=settings["backend_threads"]
+    )
+    backend = next((b for b in backends if b.name == args.backend), None)
+    if backend is None:
+        raise SystemExit(f"{args.backend} backend unavailable: {skipped.get(args.backend)}")
+
+    batch = np.random.default_rng(0).integers(0, 256, size=(args.batch_size, *IMAGE_SIZE, 3), dtype=np.uint8)
+    for _ in range(args.warmup):
+        backend.predict(batch)
+
+    latencies = []
+    lock = threading.Lock()
+    remaining = [args.requests]
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            backend.predict(batch)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    result = {
+        "latency_ms": latency_summary(latencies),
+        "requests_per_second": round(len(latencies) / seconds, 2),
+        "images_per_second": round(len(latencies) * args.batch_size / seconds, 2),
+        "runtime": runtime_config.runtime_report(settings)
+    }
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+def sweep(args):
+    """Parent process: one child per combination of settings"""
+    grid = list(itertools.product(
+        args.intra, args.inter, args.onednn, args.cpus, args.backend_threads, args.concurrency, args.batch_size
+    ))
+    print(f"🔬 {len(grid)} combinations, {args.requests} requests each ({args.crop}, {args.backend})")
+
+    results = []
+    for intra, inter, onednn, cpus, backend_threads, concurrency, batch_size in grid:
+        setting = {
+            "intra_op_threads": intra, "inter_op_threads": inter, "onednn": onednn, "cpus": cpus,
+            "backend_threads": backend_threads, "concurrency": concurrency, "batch_size": batch_size
+        }
+        env = {
+            **os.environ,
+            "TF_INTRA_OP_THREADS": str(intra),
+            "TF_INTER_OP_THREADS": str(inter),
+            "TF_ENABLE_ONEDNN_OPTS": onednn,
+            "CPU_AFFINITY": cpus,
+            "BACKEND_THREADS": str(backend_threads),
+            "TF_CPP_MIN_LOG_LEVEL": "3"
+        }
+        env.pop("INFERENCE_SERVER_SOCKET", None)
+        command = [
+            sys.executable, __file__, "--run-one", "--crop", args.crop, "--backend", args.backend,
+            "--concurrency", str(concurrency), "--batch-size", str(batch_size),
+            "--requests", str(args.requests), "--warmup", str(args.warmup)
+        ]
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+        if completed.returncode != 0 or not lines:
+            error = (completed.stderr.strip().splitlines() or ["no output"])[-1]
+            print(f"⚠️ {setting} failed: {error}")
+            results.append({"settings": setting, "error": error})
+            continue
+        result = json.loads(lines[-1][len(RESULT_PREFIX):])
+        results.append({"settings": setting, **result})
+        latency = result["latency_ms"]
+        print(f"✅ {setting} -> p50 {latency['p50']} ms, p99 {latency['p99']} ms, "
+              f"{result['images_per_second']} images/s")
+
+    ok = [r for r in results if "error" not in r]
+    if ok:
+        print("\n" + "=" * 60)
+        print("📊 By throughput (images/s, p50/p99 ms)")
+        print("=" * 60)
+        for r in sorted(ok, key=lambda r: r["images_per_second"], reverse=True):
+            s = r["settings"]
+            print(f"{r['images_per_second']:>9} {r['latency_ms']['p50']:>9} {r['latency_ms']['p99']:>9}  "
+                  f"intra={s['intra_op_threads']} inter={s['inter_op_threads']} onednn={s['onednn'] or 'default'} "
+                  f"cpus={s['cpus'] or 'all'} backend_threads={s['backend_threads']} "
+                  f"concurrency={s['concurrency']} batch={s['batch_size']}")
+
+    report = {"crop": args.crop, "backend": args.backend, "requests": args.requests,
+              "cpu_count": os.cpu_count(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep TensorFlow runtime settings for the serving models")
+    parser.add_argument("--crop", default="rice", choices=("rice", "tea", "chili"))
+    parser.add_argument("--backend", default="keras", choices=("keras", "savedmodel", "tflite", "tflite_int8", "onnx"))
+    parser.add_argument("--intra", nargs="+", type=int, default=[0], help="TF_INTRA_OP_THREADS values (0 = default)")
+    parser.add_argument("--inter", nargs="+", type=int, default=[0], help="TF_INTER_OP_THREADS values (0 = default)")
+    parser.add_argument("--onednn", nargs="+", default=[""], help="TF_ENABLE_ONEDNN_OPTS values (0, 1; empty = default)")
+    parser.add_argument("--cpus", nargs="+", default=[""], help="CPU_AFFINITY values, e.g. 0-3 (empty = all)")
+    parser.add_argument("--backend-threads", nargs="+", type=int, default=[1], help="BACKEND_THREADS values (TFLite/ONNX)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4], help="Concurrent clients")
+    parser.add_argument("--batch-size", nargs="+", type=int, default=[1], help="Images per request")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per combination")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests first")
+    parser.add_argument("--output", default="runtime_benchmark.json")
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        args.concurrency = args.concurrency[0]
+        args.batch_size = args.batch_size[0]
+        run_one(args)
+    else:
+        sweep(args)
@@ -1,4 +1,5 @@
 import os
+import threading
 import joblib
 import pandas as pd
 from typing import List, Dict, Any
@@ -83,7 +84,18 @@ def load_or_train_model() -> Pipeline:
   return pipe
 
 
-model = load_or_train_model()
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model() -> Pipeline:
+  """Load (or train) the model on first use instead of at import time"""
+  global _model
+  if _model is None:
+    with _model_lock:
+      if _model is None:
+        _model = load_or_train_model()
+  return _model
 
 
 def predict_suitability(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -99,6 +111,7 @@ def predict_suitability(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
   df['irrigation'] = df['irrigation'].astype(bool)
 
   # Get predictions with probabilities
+  model = get_model()
   proba = model.predict_proba(df)[0]
   classes = list(model.classes_)
   
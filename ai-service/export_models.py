@@ -0,0 +1,141 @@
+"""
+Export Crop Disease Models for Serving
+Writes per-crop inference artifacts (SavedModel signature, TFLite, optional ONNX)
+that main.py can serve instead of the full Keras models
+
+Usage:
+    python export_models.py                       # all crops, all formats
+    python export_models.py --crops rice --formats tflite
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from inference_backends import (
+    EXPORT_DIR, SERVING_SIGNATURE, export_paths, read_manifest, with_uint8_input,
+    SavedModelBackend, TFLiteBackend, ONNXBackend
+)
+
+# Same .keras files as MODELS_CONFIG in main.py
+MODEL_PATHS = {
+    "rice": "models/best_model.keras",
+    "tea": "models/tea/tea_best_model.keras",
+    "chili": "models/chili/chili_best_model.keras"
+}
+EXPORT_FORMATS = ("savedmodel", "tflite", "onnx")
+
+
+def export_saved_model(serving_model, path):
+    """Frozen serving signature: uint8 [None, H, W, 3] images -> class probabilities"""
+    image_spec = tf.TensorSpec(shape=(None, *serving_model.input_shape[1:]), dtype=tf.uint8, name="images")
+    # ExportArchive also tracks Keras-only state (e.g. augmentation seed generators)
+    archive = keras.export.ExportArchive()
+    archive.track(serving_model)
+    archive.add_endpoint(
+        name=SERVING_SIGNATURE,
+        fn=lambda images: {"probabilities": serving_model(images, training=False)},
+        input_signature=[image_spec]
+    )
+    archive.write_out(path, verbose=False)
+
+
+def export_tflite(saved_model_path, path):
+    # Float32 graph; XNNPACK picks it up at load time without extra flags
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_path, signature_keys=[SERVING_SIGNATURE])
+    converter.optimizations = []
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(serving_model, path):
+    import tf2onnx
+
+    image_spec = tf.TensorSpec(shape=(None, *serving_model.input_shape[1:]), dtype=tf.uint8, name="images")
+    tf2onnx.convert.from_keras(serving_model, input_signature=[image_spec], opset=17, output_path=path)
+
+
+def export_crop(crop_type, formats=EXPORT_FORMATS, export_dir=EXPORT_DIR):
+    """Export one crop model; returns the manifest written next to the artifacts"""
+    source_path = MODEL_PATHS[crop_type]
+    if not os.path.exists(source_path):
+        print(f"⚠️ {crop_type.title()} model not found at {source_path}, skipping")
+        return None
+
+    print(f"\n🔄 Exporting {crop_type} model from {source_path}...")
+    serving_model = with_uint8_input(keras.models.load_model(source_path))
+    paths = export_paths(crop_type, export_dir)
+    os.makedirs(paths["dir"], exist_ok=True)
+
+    # Random probe batch used to check every artifact against Keras
+    probe = np.random.default_rng(0).integers(0, 256, size=(4, *serving_model.input_shape[1:]), dtype=np.uint8)
+    reference = serving_model(probe, training=False).numpy()
+
+    manifest = {
+        "crop_type": crop_type,
+        "source": source_path,
+        "input_shape": list(serving_model.input_shape[1:]),
+        "input_dtype": "uint8",
+        "num_classes": int(reference.shape[-1]),
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        # Keep entries for artifacts not re-exported this run (e.g. int8 from quantize_models.py)
+        "artifacts": read_manifest(paths["manifest"]).get("artifacts", {})
+    }
+
+    # TFLite is converted from the SavedModel, so it is always written first
+    needs_saved_model = "savedmodel" in formats or "tflite" in formats
+    if needs_saved_model:
+        shutil.rmtree(paths["savedmodel"], ignore_errors=True)
+        export_saved_model(serving_model, paths["savedmodel"])
+
+    exporters = {
+        "savedmodel": (lambda: None, lambda: SavedModelBackend(paths["savedmodel"])),
+        "tflite": (lambda: export_tflite(paths["savedmodel"], paths["tflite"]), lambda: TFLiteBackend(paths["tflite"])),
+        "onnx": (lambda: export_onnx(serving_model, paths["onnx"]), lambda: ONNXBackend(paths["onnx"]))
+    }
+    for fmt in formats:
+        export, load = exporters[fmt]
+        try:
+            export()
+            diff = float(np.max(np.abs(load().predict(probe) - reference)))
+        except ImportError as e:
+            print(f"⚠️ {fmt} export skipped ({e.name} not installed)")
+            continue
+        except Exception as e:
+            print(f"❌ {fmt} export failed: {e}")
+            continue
+        manifest["artifacts"][fmt] = {
+            "path": os.path.relpath(paths[fmt], paths["dir"]),
+            "max_abs_diff": diff
+        }
+        print(f"✅ {fmt}: {paths[fmt]} (max |diff| vs keras = {diff:.2e})")
+
+    if needs_saved_model and "savedmodel" not in formats:
+        shutil.rmtree(paths["savedmodel"], ignore_errors=True)
+
+    with open(paths["manifest"], "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export crop disease models for serving")
+    parser.add_argument("--crops", nargs="+", default=list(MODEL_PATHS), choices=list(MODEL_PATHS))
+    parser.add_argument("--formats", nargs="+", default=list(EXPORT_FORMATS), choices=list(EXPORT_FORMATS))
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📦 Exporting Crop Disease Models")
+    print("=" * 60)
+    for crop_type in args.crops:
+        export_crop(crop_type, args.formats, args.export_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Grad-CAM Engine
+Builds a per-crop multi-output model (last conv activations + predictions) once at
+model load time, so each explanation costs one forward and one backward pass
+"""
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+BACKBONE_NAMES = ("mobilenet", "efficientnet")
+
+
+def split_at_backbone(model):
+    """
+    Split a classifier built as Input -> [augmentation] -> backbone -> head
+    into (pre_layers, backbone, head_layers)
+    """
+    layers_list = [layer for layer in model.layers if not isinstance(layer, keras.layers.InputLayer)]
+    for i, layer in enumerate(layers_list):
+        if isinstance(layer, keras.Model) and any(name in layer.name.lower() for name in BACKBONE_NAMES):
+            return layers_list[:i], layer, layers_list[i + 1:]
+    raise ValueError(f"No MobileNet/EfficientNet backbone found in {model.name}")
+
+
+class GradCAMEngine:
+    """
+    Compiled Grad-CAM for one crop model
+
+    Inputs are uint8 images; the 1/255 rescaling the models were trained
+    with runs inside the graph.
+    """
+
+    def __init__(self, model):
+        pre_layers, backbone, head_layers = split_at_backbone(model)
+        self.input_shape = tuple(model.input_shape[1:])
+
+        # Replay the classifier on a fresh input, exposing the backbone output.
+        # Layers are reused, so weights are shared with the served model.
+        inputs = keras.Input(shape=self.input_shape, dtype="uint8")
+        x = keras.layers.Rescaling(1.0 / 255)(inputs)
+        for layer in pre_layers:
+            x = layer(x, training=False)
+        conv_outputs = backbone(x, training=False)
+        x = conv_outputs
+        for layer in head_layers:
+            x = layer(x, training=False)
+        self.grad_model = keras.Model(inputs, [conv_outputs, x], name=f"{model.name}_gradcam")
+
+        # Head only (conv activations -> predictions), for heatmaps from cached activations
+        self.activation_shape = tuple(conv_outputs.shape[1:])
+        head_inputs = keras.Input(shape=self.activation_shape)
+        x = head_inputs
+        for layer in head_layers:
+            x = layer(x, training=False)
+        self.head_model = keras.Model(head_inputs, x, name=f"{model.name}_head")
+
+        image_spec = tf.TensorSpec(shape=(None, *self.input_shape), dtype=tf.uint8)
+        self._explain = tf.function(
+            self._explain_batch,
+            input_signature=[image_spec, tf.TensorSpec(shape=(None,), dtype=tf.int32)]
+        )
+        self._predict_explain = tf.function(self._predict_explain_batch, input_signature=[image_spec])
+        self._forward = tf.function(self._forward_batch, input_signature=[image_spec])
+        self._explain_activations = tf.function(
+            self._explain_activations_batch,
+            input_signature=[
+                tf.TensorSpec(shape=(None, *self.activation_shape), dtype=tf.float32),
+                tf.TensorSpec(shape=(None,), dtype=tf.int32)
+            ]
+        )
+
+        # The replayed graph must reproduce the served model exactly
+        probe = np.full((1, *self.input_shape), 128, dtype=np.uint8)
+        _, probe_preds = self.grad_model(probe, training=False)
+        expected = model(probe.astype(np.float32) / 255.0, training=False)
+        if not np.allclose(probe_preds.numpy(), expected.numpy(), atol=1e-5):
+            raise ValueError(f"Grad-CAM graph for {model.name} does not match the model output")
+
+    @staticmethod
+    def _weighted_heatmaps(conv_outputs, grads):
+        pooled_grads = tf.reduce_mean(grads, axis=(1, 2))
+
+        # Weight conv outputs by gradients, ReLU and normalise per image
+        heatmaps = tf.reduce_sum(conv_outputs * pooled_grads[:, tf.newaxis, tf.newaxis, :], axis=-1)
+        heatmaps = tf.nn.relu(heatmaps)
+        peak = tf.reduce_max(heatmaps, axis=(1, 2), keepdims=True)
+        return tf.math.divide_no_nan(heatmaps, peak)
+
+    def _explain_batch(self, images, class_idx):
+        with tf.GradientTape() as tape:
+            conv_outputs, predictions = self.grad_model(images, training=False)
+            scores = tf.gather(predictions, class_idx, axis=1, batch_dims=1)
+
+        # Gradients of each image's class score w.r.t. its own conv activations
+        grads = tape.gradient(scores, conv_outputs)
+        return predictions, self._weighted_heatmaps(conv_outputs, grads)
+
+    def _predict_explain_batch(self, images):
+        # Same taped pass, but the target class is the model's own top prediction
+        with tf.GradientTape() as tape:
+            conv_outputs, predictions = self.grad_model(images, training=False)
+            class_idx = tf.argmax(predictions, axis=1, output_type=tf.int32)
+            scores = tf.gather(predictions, class_idx, axis=1, batch_dims=1)
+
+        grads = tape.gradient(scores, conv_outputs)
+        return predictions, class_idx, self._weighted_heatmaps(conv_outputs, grads)
+
+    def _forward_batch(self, images):
+        conv_outputs, predictions = self.grad_model(images, training=False)
+        return predictions, conv_outputs
+
+    def _explain_activations_batch(self, conv_outputs, class_idx):
+        # Backward pass through the classification head only
+        with tf.GradientTape() as tape:
+            tape.watch(conv_outputs)
+            predictions = self.head_model(conv_outputs, training=False)
+            scores = tf.gather(predictions, class_idx, axis=1, batch_dims=1)
+
+        grads = tape.gradient(scores, conv_outputs)
+        return self._weighted_heatmaps(conv_outputs, grads)
+
+    def explain(self, img_array, class_idx):
+        """Return (predictions, heatmaps) for a batch and one target class per image"""
+        class_idx = np.broadcast_to(np.asarray(class_idx, dtype=np.int32), (len(img_array),))
+        predictions, heatmaps = self._explain(tf.convert_to_tensor(img_array, dtype=tf.uint8), class_idx)
+        return predictions.numpy(), heatmaps.numpy()
+
+    def predict_with_explanation(self, img_array):
+        """
+        Classify and explain a batch from a single taped forward pass
+
+        Returns (predictions, predicted class indices, heatmaps)
+        """
+        predictions, class_idx, heatmaps = self._predict_explain(tf.convert_to_tensor(img_array, dtype=tf.uint8))
+        return predictions.numpy(), class_idx.numpy(), heatmaps.numpy()
+
+    def predict_with_activations(self, img_array):
+        """
+        Forward pass only (no gradients)
+
+        Returns (predictions, conv activations); the activations can be kept and
+        explained later with heatmap_from_activations
+        """
+        predictions, conv_outputs = self._forward(tf.convert_to_tensor(img_array, dtype=tf.uint8))
+        return predictions.numpy(), conv_outputs.numpy()
+
+    def heatmap_from_activations(self, conv_outputs, class_idx):
+        """Grad-CAM heatmap for a single image from its cached conv activations"""
+        conv_outputs = np.asarray(conv_outputs, dtype=np.float32)[np.newaxis]
+        heatmaps = self._explain_activations(conv_outputs, np.array([class_idx], dtype=np.int32))
+        return heatmaps.numpy()[0]
+
+    def heatmap(self, img_array, class_idx):
+        """Grad-CAM heatmap for the first image of a batch"""
+        _, heatmaps = self.explain(img_array[:1], class_idx)
+        return heatmaps[0]
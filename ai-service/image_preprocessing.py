@@ -0,0 +1,211 @@
+"""
+Image Preprocessing Engine
+Fast, bounded decoding of leaf photos into model-sized uint8 arrays with per-stage timings
+"""
+
+import io
+import time
+from collections import deque
+
+import numpy as np
+from PIL import Image
+
+from inference_batcher import METRICS_WINDOW, latency_summary
+
+# Formats the service accepts (PIL format names)
+SUPPORTED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "BMP"}
+
+STAGES = ("decode", "resize", "to_array")
+
+# Leading bytes of those formats; uploads are sniffed before anything is decoded
+MAGIC_NUMBERS = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"BM", "BMP")
+)
+HEADER_BYTES = 16
+
+
+def sniff_format(header):
+    """Image format named by an upload's first bytes, None if it is not one we accept"""
+    for magic, image_format in MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return image_format
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def difference_hash(image, hash_size=8):
+    """
+    64-bit dHash of an RGB image (as a Python int)
+
+    Each bit says whether a pixel of a tiny grayscale thumbnail is brighter
+    than its right neighbour, so re-compressed or slightly re-framed copies
+    of a photo differ in only a few bits.
+    """
+    thumbnail = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class ImageRejected(ValueError):
+    """Upload that cannot (or should not) be decoded; carries the HTTP status to return"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class PreprocessingStats:
+    """Per-stage latency windows and rejection counters"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.stage_ms = {stage: deque(maxlen=window) for stage in STAGES}
+        self.images = 0
+        self.draft_decodes = 0
+        self.rejected = 0
+
+    def record(self, timings):
+        self.images += 1
+        for stage in STAGES:
+            if stage in timings:
+                self.stage_ms[stage].append(timings[stage])
+
+    def to_dict(self):
+        return {
+            "images": self.images,
+            "draft_decodes": self.draft_decodes,
+            "rejected": self.rejected,
+            **{f"{stage}_ms": latency_summary(samples) for stage, samples in self.stage_ms.items()}
+        }
+
+
+class ImagePreprocessor:
+    """
+    Decode uploads straight to (near) model resolution
+
+    JPEGs are decoded with PIL draft mode, which lets libjpeg scale by 1/2,
+    1/4 or 1/8 during DCT decoding. A 12 MP phone photo therefore comes out
+    at roughly 500x375 instead of 4000x3000 before the final resize.
+    """
+
+    def __init__(self, target_size=(224, 224), max_bytes=15 * 1024 * 1024, max_pixels=40_000_000):
+        self.target_size = tuple(target_size)
+        self.max_bytes = int(max_bytes)
+        self.max_pixels = int(max_pixels)
+        self.stats = PreprocessingStats()
+
+    def _reject(self, message, status_code=400):
+        self.stats.rejected += 1
+        return ImageRejected(message, status_code)
+
+    def check_size(self, size):
+        if size > self.max_bytes:
+            raise self._reject(
+                f"Image is too large ({size // 1024} KB); the limit is {self.max_bytes // 1024} KB",
+                status_code=413
+            )
+
+    def scan(self, stream, hasher=None, chunk_size=256 * 1024):
+        """
+        Validate a file-like upload without loading it
+
+        The format is sniffed from the first bytes; with a `hasher`
+        (hashlib object) the rest is read in chunks to hash it, stopping as
+        soon as the size limit is passed. Leaves the stream at the start.
+        """
+        stream.seek(0)
+        header = stream.read(HEADER_BYTES)
+        if not header:
+            raise self._reject("Empty image upload")
+        if sniff_format(header) is None:
+            raise self._reject("Not a supported image. Please upload a JPEG, PNG or WebP photo.", status_code=415)
+        if hasher is not None:
+            hasher.update(header)
+            size = len(header)
+            while chunk := stream.read(chunk_size):
+                size += len(chunk)
+                self.check_size(size)
+                hasher.update(chunk)
+        stream.seek(0)
+
+    def open(self, source):
+        """
+        Read the header only and validate size/format before decoding any pixels
+
+        `source` is the upload's bytes or a seekable binary file, which PIL
+        then reads directly.
+        """
+        if isinstance(source, (bytes, bytearray)):
+            size = len(source)
+            stream = io.BytesIO(source)
+        else:
+            stream = source
+            size = stream.seek(0, io.SEEK_END)
+            stream.seek(0)
+        if not size:
+            raise self._reject("Empty image upload")
+        self.check_size(size)
+        try:
+            image = Image.open(stream)
+        except Image.DecompressionBombError:
+            raise self._reject("Image resolution is too large", status_code=413)
+        except (Image.UnidentifiedImageError, OSError, SyntaxError):
+            raise self._reject("Could not read image. Please upload a JPEG, PNG or WebP photo.")
+
+        if image.format not in SUPPORTED_FORMATS:
+            raise self._reject(f"Unsupported image format: {image.format}", status_code=415)
+        width, height = image.size
+        if width * height > self.max_pixels:
+            raise self._reject(
+                f"Image resolution {width}x{height} exceeds the {self.max_pixels // 1_000_000} MP limit",
+                status_code=413
+            )
+        return image
+
+    def decode(self, source, timings=None):
+        """
+        Decode and resize an upload
+
+        Returns the RGB image at target size. Stage durations (ms) are
+        written to `timings` when a dict is given.
+        """
+        timings = {} if timings is None else timings
+
+        started = time.perf_counter()
+        image = self.open(source)
+        if image.format in ("JPEG", "MPO"):
+            # Let libjpeg downscale while decoding; result is still >= target size
+            if image.draft("RGB", self.target_size) is not None:
+                self.stats.draft_decodes += 1
+        try:
+            image.load()
+        except (OSError, SyntaxError, ValueError):
+            raise self._reject("Image data is corrupted or truncated.")
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        decoded = time.perf_counter()
+        timings["decode"] = (decoded - started) * 1000
+
+        # reducing_gap does a cheap integer box reduction first for non-draft formats
+        image = image.resize(self.target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        timings["resize"] = (time.perf_counter() - decoded) * 1000
+        return image
+
+    def preprocess(self, source, timings=None):
+        """
+        Decode and resize; returns (uint8 batch of one, resized RGB image)
+
+        Pixels stay uint8 - the served models rescale to [0, 1] inside their graph.
+        """
+        timings = {} if timings is None else timings
+        image = self.decode(source, timings)
+
+        started = time.perf_counter()
+        img_array = np.asarray(image, dtype=np.uint8)[np.newaxis]
+        timings["to_array"] = (time.perf_counter() - started) * 1000
+
+        self.stats.record(timings)
+        return img_array, image
@@ -0,0 +1,80 @@
+"""
+Shared-Memory Image Ring
+Fixed-size uint8 image slots in one multiprocessing.shared_memory block, so an
+HTTP worker hands decoded images to the inference server without pickling
+the pixels; only (ring name, slot numbers) cross the socket
+"""
+
+from collections import deque
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+class ImageRing:
+    """
+    Slots owned by one worker process (created and unlinked by it)
+
+    Slots are taken and given back on the worker's event loop, so no
+    cross-process locking is needed: the server only reads a slot between
+    the request that names it and the reply.
+    """
+
+    def __init__(self, slots, image_shape):
+        self.slots = int(slots)
+        self.image_shape = tuple(image_shape)
+        slot_bytes = int(np.prod(self.image_shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * slot_bytes)
+        self.array = np.ndarray((self.slots, *self.image_shape), dtype=np.uint8, buffer=self.shm.buf)
+        self._free = deque(range(self.slots))
+        self.puts = 0
+        self.fallbacks = 0
+
+    @property
+    def ref(self):
+        """What the server needs to attach the ring"""
+        return self.shm.name, self.slots, self.image_shape
+
+    def put(self, images):
+        """
+        Copy images into free slots; returns their slot numbers, or None (and
+        takes nothing) when there are not enough free slots or shapes differ
+        """
+        if len(images) > len(self._free) or any(image.shape != self.image_shape for image in images):
+            self.fallbacks += 1
+            return None
+        slots = [self._free.popleft() for _ in images]
+        for slot, image in zip(slots, images):
+            self.array[slot] = image
+        self.puts += len(slots)
+        return slots
+
+    def release(self, slots):
+        self._free.extend(slots)
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def stats(self):
+        return {
+            "name": self.shm.name,
+            "slots": self.slots,
+            "free": len(self._free),
+            "images": self.puts,
+            "fallbacks": self.fallbacks
+        }
+
+
+def attach_ring(ref):
+    """
+    Server side: (SharedMemory, slot array) of a worker's ring
+
+    The worker owns the block; it is unregistered from this process's
+    resource tracker so the server exiting does not unlink it.
+    """
+    name, slots, image_shape = ref
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm, np.ndarray((slots, *image_shape), dtype=np.uint8, buffer=shm.buf)
@@ -0,0 +1,278 @@
+"""
+Inference Runtime Backends
+Keras, SavedModel, TFLite (XNNPACK) and ONNX Runtime behind one predict()
+interface, with startup selection of the fastest runtime that matches Keras
+"""
+
+import os
+import json
+import queue
+import statistics
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+# Exported artifacts live in EXPORT_DIR/<crop>/ (written by export_models.py)
+EXPORT_DIR = os.path.join("models", "exported")
+SAVED_MODEL_DIR = "saved_model"
+TFLITE_FILE = "model.tflite"
+INT8_TFLITE_FILE = "model_int8.tflite"
+ONNX_FILE = "model.onnx"
+MANIFEST_FILE = "manifest.json"
+SERVING_SIGNATURE = "serving_default"
+
+BACKEND_NAMES = ("keras", "savedmodel", "tflite", "onnx")
+# Lossy variants are never picked by parity; quantize_models.py records their accuracy
+QUANTIZED_BACKEND_NAMES = ("tflite_int8",)
+
+
+def with_uint8_input(model):
+    """
+    Wrap a trained model so it takes uint8 images
+
+    The 1/255 rescaling used in training (ImageDataGenerator rescale) becomes a
+    Rescaling layer inside the graph, so requests pass uint8 pixels directly
+    instead of building float64 arrays in Python.
+    """
+    inputs = keras.Input(shape=model.input_shape[1:], dtype="uint8")
+    x = layers.Rescaling(1.0 / 255)(inputs)
+    outputs = model(x, training=False)
+    return keras.Model(inputs, outputs, name=f"{model.name}_uint8")
+
+
+def export_paths(crop_type, export_dir=EXPORT_DIR):
+    """Locations of every exported artifact for a crop"""
+    crop_dir = os.path.join(export_dir, crop_type)
+    return {
+        "dir": crop_dir,
+        "savedmodel": os.path.join(crop_dir, SAVED_MODEL_DIR),
+        "tflite": os.path.join(crop_dir, TFLITE_FILE),
+        "tflite_int8": os.path.join(crop_dir, INT8_TFLITE_FILE),
+        "onnx": os.path.join(crop_dir, ONNX_FILE),
+        "manifest": os.path.join(crop_dir, MANIFEST_FILE)
+    }
+
+
+def read_manifest(path):
+    """Manifest written by export_models.py / quantize_models.py ({} if missing)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class KerasBackend:
+    """
+    Keras model behind a traced serving function (always available; the
+    reference for parity checks)
+
+    model.predict builds a data adapter and callbacks on every call. The
+    tf.function has a fixed [None, H, W, 3] uint8 signature, so it is traced
+    once and every batch size reuses the same graph.
+    """
+
+    name = "keras"
+    quantized = False
+
+    def __init__(self, serving_model):
+        self.model = serving_model
+        image_spec = tf.TensorSpec(shape=(None, *serving_model.input_shape[1:]), dtype=tf.uint8)
+        self._serve = tf.function(self._serve_batch, input_signature=[image_spec])
+
+    def _serve_batch(self, images):
+        return self.model(images, training=False)
+
+    def predict(self, img_batch):
+        return self._serve(tf.convert_to_tensor(img_batch, dtype=tf.uint8)).numpy()
+
+
+class SavedModelBackend:
+    """Frozen SavedModel serving signature (uint8 images -> probabilities)"""
+
+    name = "savedmodel"
+    quantized = False
+
+    def __init__(self, path):
+        self.path = path
+        self.loaded = tf.saved_model.load(path)
+        self.signature = self.loaded.signatures[SERVING_SIGNATURE]
+        self.output_key = next(iter(self.signature.structured_outputs))
+
+    def predict(self, img_batch):
+        outputs = self.signature(tf.convert_to_tensor(img_batch, dtype=tf.uint8))
+        return outputs[self.output_key].numpy()
+
+
+class TFLiteBackend:
+    """
+    TFLite interpreter (XNNPACK is the default CPU delegate)
+
+    Interpreters are not thread-safe, so a small pool is kept: one per
+    executor worker. Each is resized only when the batch size changes.
+    Also serves the int8 models from quantize_models.py (quantized=True).
+    """
+
+    def __init__(self, path, pool_size=1, num_threads=1, quantized=False):
+        self.path = path
+        self.quantized = quantized
+        self.name = "tflite_int8" if quantized else "tflite"
+        self._pool = queue.SimpleQueue()
+        for _ in range(max(1, int(pool_size))):
+            interpreter = tf.lite.Interpreter(model_path=path, num_threads=max(1, int(num_threads)))
+            interpreter.allocate_tensors()
+            self._pool.put(interpreter)
+
+    def predict(self, img_batch):
+        interpreter = self._pool.get()
+        try:
+            input_detail = interpreter.get_input_details()[0]
+            if input_detail["shape"][0] != len(img_batch):
+                interpreter.resize_tensor_input(input_detail["index"], img_batch.shape, strict=False)
+                interpreter.allocate_tensors()
+            interpreter.set_tensor(input_detail["index"], np.ascontiguousarray(img_batch, dtype=np.uint8))
+            interpreter.invoke()
+            return interpreter.get_tensor(interpreter.get_output_details()[0]["index"]).copy()
+        finally:
+            self._pool.put(interpreter)
+
+
+class ONNXBackend:
+    """ONNX Runtime CPU session (optional: needs the onnxruntime package)"""
+
+    name = "onnx"
+    quantized = False
+
+    def __init__(self, path, num_threads=1):
+        import onnxruntime as ort
+
+        self.path = path
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = max(1, int(num_threads))
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, img_batch):
+        return self.session.run(None, {self.input_name: np.asarray(img_batch, dtype=np.uint8)})[0]
+
+
+def artifact_bytes(path):
+    """On-disk size of an exported artifact (a file, or a SavedModel directory)"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def is_stale(artifact_path, source_path):
+    """An artifact exported before the .keras file was last written is out of date"""
+    return os.path.getmtime(artifact_path) < os.path.getmtime(source_path)
+
+
+def load_backends(crop_type, serving_model, source_path, names=BACKEND_NAMES,
+                  export_dir=EXPORT_DIR, pool_size=1, num_threads=1, max_accuracy_drop=0.02):
+    """
+    Load every requested runtime that has a fresh artifact for this crop
+
+    Quantized artifacts are only loaded when their recorded test accuracy is
+    within `max_accuracy_drop` of the float model. Returns (backends, skipped)
+    where skipped maps backend name -> reason.
+    """
+    paths = export_paths(crop_type, export_dir)
+    factories = {
+        "keras": lambda: KerasBackend(serving_model),
+        "savedmodel": lambda: SavedModelBackend(paths["savedmodel"]),
+        "tflite": lambda: TFLiteBackend(paths["tflite"], pool_size=pool_size, num_threads=num_threads),
+        "tflite_int8": lambda: TFLiteBackend(
+            paths["tflite_int8"], pool_size=pool_size, num_threads=num_threads, quantized=True
+        ),
+        "onnx": lambda: ONNXBackend(paths["onnx"], num_threads=num_threads)
+    }
+    artifacts = read_manifest(paths["manifest"]).get("artifacts", {})
+
+    backends = []
+    skipped = {}
+    for name in names:
+        if name not in factories:
+            skipped[name] = "unknown backend"
+            continue
+        if name != "keras":
+            if not os.path.exists(paths[name]):
+                skipped[name] = "not exported"
+                continue
+            if is_stale(paths[name], source_path):
+                skipped[name] = "stale export (re-run export_models.py)"
+                continue
+        if name in QUANTIZED_BACKEND_NAMES:
+            accuracy_delta = artifacts.get(name, {}).get("accuracy_delta")
+            if accuracy_delta is None:
+                skipped[name] = "no accuracy report (re-run quantize_models.py)"
+                continue
+            if -accuracy_delta > max_accuracy_drop:
+                skipped[name] = f"accuracy drop {-accuracy_delta:.3f} exceeds {max_accuracy_drop}"
+                continue
+        try:
+            backends.append(factories[name]())
+        except Exception as e:
+            skipped[name] = f"failed to load: {e}"
+    return backends, skipped
+
+
+def benchmark_backend(backend, probe, repeats=5):
+    """Median latency (ms) of predict() on a probe batch, after one warm-up call"""
+    backend.predict(probe)
+    samples = []
+    for _ in range(max(1, repeats)):
+        started = time.perf_counter()
+        backend.predict(probe)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def warm_up(predict_fn, input_shape, batch_sizes):
+    """
+    Run synthetic uint8 batches through predict_fn once per batch size
+
+    The first call traces/allocates; later sizes prime shape-specific kernels.
+    Returns {batch_size: ms}.
+    """
+    timings = {}
+    for size in batch_sizes:
+        started = time.perf_counter()
+        predict_fn(np.zeros((size, *input_shape), dtype=np.uint8))
+        timings[size] = round((time.perf_counter() - started) * 1000, 3)
+    return timings
+
+
+def select_backend(backends, probe, reference=None, atol=1e-3, repeats=5):
+    """
+    Pick the fastest backend whose output matches the reference on the probe
+
+    `reference` defaults to the Keras backend's output. Quantized backends are
+    not parity-checked (their accuracy is gated in load_backends). Returns
+    (backend, report) where report maps name -> latency_ms or the rejection.
+    """
+    if reference is None:
+        keras_backend = next((b for b in backends if b.name == "keras"), None)
+        reference = keras_backend.predict(probe) if keras_backend is not None else None
+
+    best = None
+    best_ms = float("inf")
+    report = {}
+    for backend in backends:
+        try:
+            if reference is not None and not backend.quantized:
+                diff = float(np.max(np.abs(backend.predict(probe) - reference)))
+                if diff > atol:
+                    report[backend.name] = {"rejected": f"output differs from keras by {diff:.2e}"}
+                    continue
+            latency_ms = benchmark_backend(backend, probe, repeats)
+        except Exception as e:
+            report[backend.name] = {"rejected": f"probe failed: {e}"}
+            continue
+        report[backend.name] = {"latency_ms": round(latency_ms, 3)}
+        if latency_ms < best_ms:
+            best, best_ms = backend, latency_ms
+    return best, report
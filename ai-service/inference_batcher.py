@@ -0,0 +1,177 @@
+"""
+Dynamic Micro-Batching for Crop Disease Inference
+Collects concurrent prediction requests per crop into a single forward pass
+"""
+
+import asyncio
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+# Number of recent samples kept for latency percentiles
+METRICS_WINDOW = 1024
+
+
+def latency_summary(samples):
+    """count/mean/p50/p95/p99/max of a window of millisecond samples"""
+    if not samples:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = np.fromiter(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(values.max()), 3)
+    }
+
+
+class BatcherMetrics:
+    """Queue depth, batch-size histogram and wait-time statistics for one batcher"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = Counter()
+        self.wait_ms = deque(maxlen=window)
+        self.inference_ms = deque(maxlen=window)
+
+    def to_dict(self, queue_depth):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "errors": self.errors,
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_batch_size": round(self.requests / self.batches, 3) if self.batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "wait_ms": latency_summary(self.wait_ms),
+            "inference_ms": latency_summary(self.inference_ms)
+        }
+
+
+class MicroBatcher:
+    """
+    Per-crop batching queue
+
+    Requests are collected until either `max_batch_size` items are waiting or
+    `max_wait_ms` has passed since the first item of the batch arrived. The
+    batch is stacked, run through `predict_fn` once and each caller receives
+    its own row of the result. `predict_fn` may return a single array or a
+    tuple of arrays, all indexed by batch position. `collate_fn` builds the
+    batch from the submitted items (np.stack by default).
+    """
+
+    def __init__(self, name, predict_fn, max_batch_size=16, max_wait_ms=10.0, executor=None, collate_fn=np.stack):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.collate_fn = collate_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+        self.metrics = BatcherMetrics()
+        self._queue = None
+        self._worker = None
+        # Requests taken off the queue that have not had their result yet
+        self._current = []
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Start the background worker on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker and fail any requests still waiting, queued or in the batch being run"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        waiting = self._current
+        self._current = []
+        while self._queue is not None and not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        for _, future, _ in waiting:
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} batcher stopped"))
+
+    async def submit(self, item):
+        """Queue a single (unbatched) input and wait for its prediction"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        self.metrics.requests += 1
+        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect(self):
+        """Wait for the first request, then fill the batch until full or the window closes"""
+        batch = self._current = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Window closed - still take anything already queued
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Drop callers that have already gone away (client disconnects)
+            batch = self._current = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.metrics.wait_ms.append((started - enqueued) * 1000)
+            self.metrics.batches += 1
+            self.metrics.batch_sizes[len(batch)] += 1
+
+            try:
+                inputs = self.collate_fn([item for item, _, _ in batch])
+                outputs = await loop.run_in_executor(self.executor, self.predict_fn, inputs)
+            except Exception as e:
+                self.metrics.errors += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.metrics.inference_ms.append((time.perf_counter() - started) * 1000)
+
+            for i, (_, future, _) in enumerate(batch):
+                if future.done():
+                    continue
+                if isinstance(outputs, tuple):
+                    future.set_result(tuple(output[i] for output in outputs))
+                else:
+                    future.set_result(outputs[i])
+            self._current = []
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            **self.metrics.to_dict(self.queue_depth)
+        }
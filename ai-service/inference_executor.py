@@ -0,0 +1,86 @@
+"""
+Bounded Executor for CPU-bound Inference Stages
+Keeps preprocessing, model forward passes and Grad-CAM off the asyncio event loop
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the executor queue is full; callers should answer 503"""
+
+    def __init__(self, retry_after):
+        super().__init__("Inference executor is saturated")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Thread pool with an admission limit
+
+    At most `max_workers` jobs run at once and at most `max_queue` more may
+    wait for a thread. Submissions beyond that are rejected immediately with
+    ExecutorSaturated instead of piling up behind a slow Grad-CAM.
+    """
+
+    def __init__(self, max_workers=2, max_queue=32, name="inference"):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._durations = deque(maxlen=256)
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, estimated from recent job durations"""
+        avg = sum(self._durations) / len(self._durations) if self._durations else 1.0
+        return max(1, math.ceil(avg * self._pending / self.max_workers))
+
+    def _timed(self, fn, args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._durations.append(time.perf_counter() - started)
+                self._pending -= 1
+                self.completed += 1
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, or raise ExecutorSaturated if the queue is full"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated(self.retry_after())
+            self._pending += 1
+        try:
+            future = self.pool.submit(self._timed, fn, args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "queue_limit": self.max_queue,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_job_ms": round(sum(self._durations) / len(self._durations) * 1000, 3) if self._durations else 0.0
+        }
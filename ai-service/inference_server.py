@@ -0,0 +1,325 @@
+"""
+Inference Server
+Multi-worker mode: one process holds the crop models and runs every forward
+pass; uvicorn workers (main.py with INFERENCE_SERVER_SOCKET set) decode
+uploads and build responses, and send images here over a Unix socket
+
+Requests from all workers land on the same micro-batchers, so concurrent
+uploads still share forward passes, and each model is in memory once.
+Decoded images travel through a shared-memory ring per worker (image_ring.py);
+the socket only carries slot numbers, metadata and results.
+
+Usage:
+    python inference_server.py [--socket /tmp/govi-inference.sock]
+"""
+
+import os
+import asyncio
+import pickle
+import struct
+import argparse
+import itertools
+
+import numpy as np
+from PIL import Image
+
+from inference_executor import ExecutorSaturated
+from image_ring import attach_ring
+
+DEFAULT_SOCKET = "/tmp/govi-inference.sock"
+# Frames are a 4-byte big-endian length followed by a pickled message
+HEADER = struct.Struct(">I")
+
+
+class InferenceServerError(RuntimeError):
+    """Error returned by the inference server; carries the HTTP status to return"""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def read_message(reader):
+    header = await reader.readexactly(HEADER.size)
+    (length,) = HEADER.unpack(header)
+    return pickle.loads(await reader.readexactly(length))
+
+
+def write_message(writer, message):
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(HEADER.pack(len(payload)) + payload)
+
+
+class InferenceClient:
+    """
+    Worker-side connection to the inference server
+
+    One connection per worker process; calls are multiplexed over it by
+    request id, so a worker can have many requests in flight. The
+    connection is opened on first use and reopened after a failure.
+    Images go through `ring` when given and it has free slots, else they
+    are pickled into the message.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=60.0, ring=None):
+        self.socket_path = socket_path
+        self.timeout = float(timeout)
+        self.ring = ring
+        self._ids = itertools.count()
+        self._pending = {}
+        # Ring slots per request, given back when its reply arrives (even after a timeout,
+        # as the server may still be reading them) or the connection drops
+        self._slots = {}
+        self._writer = None
+        self._reader_task = None
+        self._connect_lock = None
+        self.calls = 0
+        self.errors = 0
+
+    async def _connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+            self._reader_task = asyncio.create_task(self._read_replies(reader))
+
+    async def _read_replies(self, reader):
+        reason = "reply reader stopped"
+        try:
+            while True:
+                request_id, ok, value = await read_message(reader)
+                self._release_slots(request_id)
+                future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(self._error(value))
+        except Exception as e:
+            # Lost connection or a malformed reply; the next call reconnects
+            reason = e
+        finally:
+            # However the reader ends (even cancelled), nothing is left waiting on it
+            if self._writer is not None:
+                self._writer.close()
+            self._writer = None
+            error = InferenceServerError(f"Inference server connection lost: {reason}", status_code=503)
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+            for request_id in list(self._slots):
+                self._release_slots(request_id)
+
+    def _release_slots(self, request_id):
+        slots = self._slots.pop(request_id, None)
+        if slots:
+            self.ring.release(slots)
+
+    @staticmethod
+    def _error(value):
+        if value.get("retry_after") is not None:
+            return ExecutorSaturated(value["retry_after"])
+        return InferenceServerError(value["error"], value.get("status_code", 500))
+
+    async def call(self, op, images=None, **kwargs):
+        """
+        Run `op` on the server and return its result (raises InferenceServerError)
+
+        `images` (uint8 arrays, or a stacked batch) reach the op as a list of arrays.
+        """
+        self.calls += 1
+        try:
+            await self._connect()
+        except OSError as e:
+            self.errors += 1
+            raise InferenceServerError(f"Inference server unavailable: {e}", status_code=503)
+        request_id = next(self._ids)
+        if images is not None:
+            slots = self.ring.put(images) if self.ring is not None else None
+            if slots is None:
+                kwargs["images"] = list(images)
+            else:
+                self._slots[request_id] = slots
+                kwargs["ring"] = self.ring.ref
+                kwargs["slots"] = slots
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        write_message(self._writer, (request_id, op, kwargs))
+        try:
+            await self._writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.errors += 1
+            raise InferenceServerError(f"Inference server did not answer {op} in {self.timeout}s", status_code=504)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self.ring is not None:
+            self.ring.close()
+
+    def stats(self):
+        return {
+            "socket": self.socket_path,
+            "connected": self._writer is not None and not self._writer.is_closing(),
+            "in_flight": len(self._pending),
+            "calls": self.calls,
+            "errors": self.errors,
+            "image_ring": self.ring.stats() if self.ring is not None else None
+        }
+
+
+class InferenceServer:
+    """Serves the inference operations of main.py to worker processes"""
+
+    def __init__(self, service, socket_path=DEFAULT_SOCKET):
+        self.service = service
+        self.socket_path = socket_path
+        self.connections = 0
+        self.requests = 0
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        tasks = set()
+        rings = {}
+        try:
+            while True:
+                request_id, op, kwargs = await read_message(reader)
+                if "ring" in kwargs:
+                    # Views into the worker's shared memory; no pixel copy until the batch is stacked
+                    ref = kwargs.pop("ring")
+                    if ref[0] not in rings:
+                        rings[ref[0]] = attach_ring(ref)
+                    ring_array = rings[ref[0]][1]
+                    kwargs["images"] = [ring_array[slot] for slot in kwargs.pop("slots")]
+                # Each request runs concurrently, so requests from one worker batch together
+                task = asyncio.create_task(self.handle_request(writer, request_id, op, kwargs))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            self.connections -= 1
+            for shm, _ in rings.values():
+                try:
+                    shm.close()
+                except BufferError:
+                    # A cancelled request still holds a view; the mapping goes with it
+                    pass
+
+    async def handle_request(self, writer, request_id, op, kwargs):
+        self.requests += 1
+        try:
+            handler = getattr(self, f"op_{op}", None)
+            if handler is None:
+                raise InferenceServerError(f"Unknown operation: {op}", status_code=400)
+            reply = (request_id, True, await handler(**kwargs))
+        except ExecutorSaturated as e:
+            reply = (request_id, False, {"error": "busy", "retry_after": e.retry_after})
+        except Exception as e:
+            reply = (request_id, False, {"error": str(getattr(e, "detail", e)), "status_code": getattr(e, "status_code", 500)})
+        if not writer.is_closing():
+            write_message(writer, reply)
+            await writer.drain()
+
+    async def _with_model(self, crop_type, fn):
+        loaded = await self.service.acquire_crop_model(crop_type)
+        try:
+            return await fn(loaded)
+        finally:
+            self.service.release_crop_model(loaded)
+
+    async def op_model(self, crop_type):
+        """Metadata of a crop's serving version (loading it if needed)"""
+        async def info(loaded):
+            return self.service.remote_model_info(loaded)
+        return await self._with_model(crop_type, info)
+
+    async def op_submit(self, crop_type, images, explain, remember=False):
+        """
+        One image through the crop's micro-batcher; with `remember` (explain=false),
+        the explanation record stays here and only predictions and its id go back
+        """
+        async def submit(loaded):
+            if remember:
+                # Copy: the ring slot is reused once the reply is sent
+                image = Image.fromarray(np.array(images[0]))
+                predictions, prediction_id = await self.service.submit_unexplained(loaded, images[0], image)
+                return {"version": loaded["version"], "outputs": predictions, "prediction_id": prediction_id}
+            outputs = await self.service.submit_image_outputs(loaded, images[0], explain)
+            return {"version": loaded["version"], "outputs": outputs}
+        return await self._with_model(crop_type, submit)
+
+    async def op_predict(self, crop_type, images):
+        async def predict(loaded):
+            probabilities = await self.service.executor.run(self.service.predict_probabilities, loaded, np.stack(images))
+            return {"version": loaded["version"], "probabilities": probabilities}
+        return await self._with_model(crop_type, predict)
+
+    async def op_remember(self, record):
+        """Keep an explain=false prediction's record here, where any worker can explain it"""
+        return self.service.store_explanation(record)
+
+    async def op_explanation(self, prediction_id):
+        """(record, heatmap) of a remembered prediction, None if unknown or expired"""
+        explained = await self.service.explanation_heatmap(prediction_id)
+        if explained is None:
+            return None
+        record, heatmap = explained
+        # The worker only encodes the Grad-CAM images
+        return {key: record[key] for key in ("crop_type", "prediction", "image")}, heatmap
+
+    async def op_class_table(self, crop_type):
+        """The crop's current class table (None if its metadata is missing); loads no model"""
+        return self.service.class_tables.get(crop_type)
+
+    async def op_reload(self, crop_type):
+        return await asyncio.to_thread(self.service.reload_crop_model, crop_type)
+
+    async def op_status(self):
+        return self.service.server_status()
+
+    async def serve(self):
+        service = self.service
+        await service.startup_event()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle_connection, path=self.socket_path)
+        # Only processes of the same user (the workers) may connect
+        os.chmod(self.socket_path, 0o600)
+        print(f"🔌 Inference server listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await service.shutdown_event()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve crop model inference to uvicorn workers")
+    parser.add_argument("--socket", default=os.getenv("INFERENCE_SERVER_SOCKET", DEFAULT_SOCKET))
+    args = parser.parse_args()
+
+    # The server holds the models itself, whatever the workers are configured with
+    os.environ.pop("INFERENCE_SERVER_SOCKET", None)
+    import main
+
+    try:
+        asyncio.run(InferenceServer(main, args.socket).serve())
+    except KeyboardInterrupt:
+        pass
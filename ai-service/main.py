@@ -6,20 +6,49 @@ Supports Rice and Tea Leaf Disease Detection
 
 import os
 import io
+import asyncio
 import json
 import base64
+import uuid
+import hmac
+import hashlib
+import time
+import threading
+# CPU affinity and oneDNN options must be set before TensorFlow loads
+import runtime_config
+RUNTIME_SETTINGS = runtime_config.runtime_settings()
+runtime_config.apply_process_settings(RUNTIME_SETTINGS)
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 from PIL import Image
 import cv2
-from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import uvicorn
 from enum import Enum
-from crop_suitability_model import predict_suitability
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from crop_suitability_model import predict_suitability, get_model as load_suitability_model
+from inference_batcher import MicroBatcher
+from inference_executor import BoundedExecutor, ExecutorSaturated
+from gradcam_engine import GradCAMEngine
+from ttl_cache import TTLCache
+from result_cache import ResultCache, SQLiteCache, content_hash, content_hasher
+from model_registry import ModelRegistry
+from shared_backbone import MULTICROP_DIR, SharedBackbone, CropHeadBackend, multicrop_paths
+from inference_server import InferenceClient, InferenceServerError
+from image_ring import ImageRing
+from image_preprocessing import ImagePreprocessor, ImageRejected, difference_hash
+from near_duplicate_index import NearDuplicateIndex
+from inference_backends import (
+    BACKEND_NAMES, QUANTIZED_BACKEND_NAMES, with_uint8_input, load_backends, select_backend,
+    warm_up, artifact_bytes
+)
+
+runtime_config.configure_tensorflow(RUNTIME_SETTINGS)
 
 # Configuration - Multi-crop support
 MODELS_CONFIG = {
@@ -41,12 +70,109 @@ MODELS_CONFIG = {
 }
 IMAGE_SIZE = (224, 224)
 
+# Uploads beyond these limits are rejected before any pixels are decoded
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "40000000"))
+# Uploads are validated and hashed in chunks of this size; request bodies may
+# exceed the image limit by this much multipart framing
+UPLOAD_CHUNK_BYTES = 256 * 1024
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Micro-batching: concurrent uploads for the same crop share one forward pass
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "10"))
+
+# Worker threads for CPU-bound stages (decode, inference, Grad-CAM, PNG encoding)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(min(4, len(RUNTIME_SETTINGS["cpus"]) or os.cpu_count() or 1))))
+INFERENCE_QUEUE_LIMIT = int(os.getenv("INFERENCE_QUEUE_LIMIT", "32"))
+
+# Runtime for forward-only inference: auto (fastest exported artifact that
+# matches Keras) or one of keras, savedmodel, tflite, onnx
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "auto").lower()
+
+# Serve every crop from one shared backbone with per-crop heads (written by
+# train_multicrop_model.py); forward-only requests of all crops share batches
+SHARED_BACKBONE = os.getenv("SHARED_BACKBONE", "false").lower() in ("1", "true", "yes")
+MULTICROP_MODEL_DIR = os.getenv("MULTICROP_MODEL_DIR", MULTICROP_DIR)
+
+# Batch sizes pushed through every inference path at startup (1 and powers of
+# two up to BATCH_MAX_SIZE unless overridden, e.g. "1,4,16")
+WARMUP_BATCH_SIZES = sorted({
+    int(size) for size in os.getenv("WARMUP_BATCH_SIZES", "").split(",") if size.strip()
+} or {1, BATCH_MAX_SIZE, *(2 ** i for i in range(1, 8) if 2 ** i < BATCH_MAX_SIZE)})
+
+# Resident crop models: 0 = no budget (every loaded crop stays resident). Pinned
+# crops are never evicted; with LAZY_MODEL_LOADING only they load at startup and
+# other crops load on first use
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+PINNED_CROPS = [crop.strip() for crop in os.getenv("PINNED_CROPS", "").split(",") if crop.strip()]
+LAZY_MODEL_LOADING = os.getenv("LAZY_MODEL_LOADING", "false").lower() in ("1", "true", "yes")
+
+# Hot reload: poll crop model files every N seconds and swap in changed ones
+# (0 = off). POST /admin/models/{crop}/reload needs the X-Admin-Token header
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Multi-worker mode: when set, this process is an HTTP worker and sends every forward
+# pass to the inference server (inference_server.py) listening on this Unix socket
+INFERENCE_SERVER_SOCKET = os.getenv("INFERENCE_SERVER_SOCKET", "")
+INFERENCE_SERVER_TIMEOUT = float(os.getenv("INFERENCE_SERVER_TIMEOUT", "60"))
+# Shared-memory image slots per worker for handing images to the server (0 = pickle them)
+INFERENCE_SHM_SLOTS = int(os.getenv("INFERENCE_SHM_SLOTS", "64"))
+
+# float, or int8 to serve quantize_models.py output when its test accuracy is
+# within INT8_MAX_ACCURACY_DROP of the float model
+MODEL_VARIANT = os.getenv("MODEL_VARIANT", "float").lower()
+INT8_MAX_ACCURACY_DROP = float(os.getenv("INT8_MAX_ACCURACY_DROP", "0.02"))
+
+# Most images accepted by one /predict/batch request
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "50"))
+
+# Diseases below this share of a plot's images do not raise the field severity
+FIELD_MIN_PREVALENCE = float(os.getenv("FIELD_MIN_PREVALENCE", "0.1"))
+SEVERITY_RANK = {"none": 0, "unknown": 1, "low": 2, "medium": 3, "high": 4, "critical": 5}
+
+# Predictions made with explain=false keep their activations this long for /predict/{id}/gradcam
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", "128"))
+EXPLANATION_CACHE_TTL = float(os.getenv("EXPLANATION_CACHE_TTL", "300"))
+
+# Default quality for lossy Grad-CAM formats (jpeg/webp)
+GRADCAM_QUALITY = int(os.getenv("GRADCAM_QUALITY", "75"))
+
+# Repeat /predict uploads of the same image are answered from this cache (size 0 disables it).
+# RESULT_CACHE_PATH adds a SQLite file shared by every worker on the host.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")
+RESULT_CACHE_DISK_SIZE = int(os.getenv("RESULT_CACHE_DISK_SIZE", "10000"))
+
+# explain=false uploads within this many dHash bits of a recent confident prediction reuse it
+# (index size 0 disables near-duplicate detection)
+NEAR_DUPLICATE_INDEX_SIZE = int(os.getenv("NEAR_DUPLICATE_INDEX_SIZE", "1024"))
+NEAR_DUPLICATE_TTL = float(os.getenv("NEAR_DUPLICATE_TTL", "600"))
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "6"))
+NEAR_DUPLICATE_MIN_CONFIDENCE = float(os.getenv("NEAR_DUPLICATE_MIN_CONFIDENCE", "0.9"))
+
 # Crop type enum
 class CropType(str, Enum):
     rice = "rice"
     tea = "tea"
     chili = "chili"
 
+# Grad-CAM output formats
+class GradCAMFormat(str, Enum):
+    png = "png"
+    jpeg = "jpeg"
+    webp = "webp"
+    raw = "raw"
+
+GRADCAM_MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "raw": "application/octet-stream"
+}
+
 # Initialize FastAPI
 app = FastAPI(
     title="Govi Isuru - Multi-Crop Disease Predictor",
@@ -54,7 +180,46 @@ app = FastAPI(
     version="3.1.0"
 )
 
-# CORS middleware
+class UploadSizeLimit:
+    """
+    Reject oversized /predict bodies before they are parsed
+
+    A declared Content-Length over the limit gets a 413 without reading the
+    body; chunked bodies are counted as they arrive and cut off at the limit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith("/predict"):
+            await self.app(scope, receive, send)
+            return
+        images = BATCH_MAX_IMAGES if scope["path"] in ("/predict/batch", "/predict/field") else 1
+        limit = images * MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+        detail = f"Upload is too large; the limit is {MAX_UPLOAD_BYTES // 1024} KB per image"
+        
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+        
+        received = 0
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing; FastAPI passes HTTPExceptions through
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(UploadSizeLimit)
+
+# CORS middleware (added last, so it also wraps the size limit's 413s)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -75,96 +240,673 @@ def suitability_predict(payload: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 # Global variables for models and metadata (multi-crop)
-models = {}
+# loaded_models holds the version of each crop that new requests get (see
+# build_crop_model); class metadata is read for every crop at startup and stays
+# loaded when a model is evicted
+loaded_models = {}
 class_indices = {}
 class_names = {}
 disease_info = {}
+# Precomputed class table (build_class_table) of each crop's newest metadata
+class_tables = {}
+warmup_state = {}
+load_timings = {}
+# Guards loaded_models and the in-flight counts of every version
+model_swap_lock = threading.Lock()
+# One hot reload at a time; each competes with serving for CPU
+reload_lock = threading.Lock()
+# Crops load in parallel; runtime benchmarks still run one at a time so they are not skewed
+backend_selection_lock = threading.Lock()
+shared_backbone = None
+shared_backbone_lock = threading.Lock()
+warmup_task = None
+watch_task = None
+# Set at startup in multi-worker mode; loaded_models then holds the server's model metadata
+inference_client = None
+main_loop = None
+# Cross-crop batchers; per-crop batchers belong to a model version
+batchers = {}
+executor = BoundedExecutor(max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_QUEUE_LIMIT)
+preprocessor = ImagePreprocessor(IMAGE_SIZE, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_IMAGE_PIXELS)
+explanation_cache = TTLCache(max_entries=EXPLANATION_CACHE_SIZE, ttl_seconds=EXPLANATION_CACHE_TTL)
+result_cache = ResultCache(
+    TTLCache(max_entries=RESULT_CACHE_SIZE, ttl_seconds=RESULT_CACHE_TTL),
+    SQLiteCache(RESULT_CACHE_PATH, RESULT_CACHE_DISK_SIZE, RESULT_CACHE_TTL) if RESULT_CACHE_PATH else None
+) if RESULT_CACHE_SIZE > 0 else None
+near_duplicates = NearDuplicateIndex(
+    NEAR_DUPLICATE_INDEX_SIZE, NEAR_DUPLICATE_TTL, NEAR_DUPLICATE_MAX_DISTANCE
+) if NEAR_DUPLICATE_INDEX_SIZE > 0 else None
 
-def load_crop_model(crop_type: str):
-    """Load model and metadata for a specific crop type"""
-    global models, class_indices, class_names, disease_info
-    
-    config = MODELS_CONFIG.get(crop_type)
-    if not config:
-        print(f"⚠️ Unknown crop type: {crop_type}")
-        return False
+def choose_backend(crop_type, model_path, serving_model):
+    """
+    Select the runtime for forward-only inference of a crop
     
-    print(f"\n🔄 Loading {crop_type} model and metadata...")
+    With MODEL_VARIANT=int8 the quantized model is used when it passes its
+    accuracy gate. Otherwise, in auto mode every fresh exported artifact is
+    checked against Keras on a probe batch and the fastest one wins; Keras is
+    always a candidate. Returns (backend, {"selected", "candidates"}).
+    """
+    probe = np.random.default_rng(0).integers(
+        0, 256, size=(min(BATCH_MAX_SIZE, 8), *IMAGE_SIZE, 3), dtype=np.uint8
+    )
+    quantized_report = {}
+    if MODEL_VARIANT == "int8":
+        quantized, skipped = load_backends(
+            crop_type, serving_model, model_path, QUANTIZED_BACKEND_NAMES,
+            pool_size=INFERENCE_WORKERS, num_threads=RUNTIME_SETTINGS["backend_threads"],
+            max_accuracy_drop=INT8_MAX_ACCURACY_DROP
+        )
+        with backend_selection_lock:
+            backend, quantized_report = select_backend(quantized, probe)
+        quantized_report.update({name: {"skipped": reason} for name, reason in skipped.items()})
+        if backend is not None:
+            print(f"✅ {crop_type.title()} inference backend: {backend.name} {quantized_report}")
+            return backend, {"selected": backend.name, "candidates": quantized_report}
+        print(f"⚠️ {crop_type.title()} int8 model unavailable {quantized_report}, serving float")
     
-    # Load model
-    if os.path.exists(config["model_path"]):
-        models[crop_type] = keras.models.load_model(config["model_path"])
-        print(f"✅ {crop_type.title()} model loaded from {config['model_path']}")
+    names = BACKEND_NAMES if INFERENCE_BACKEND == "auto" else tuple(dict.fromkeys(("keras", INFERENCE_BACKEND)))
+    candidates, skipped = load_backends(
+        crop_type, serving_model, model_path, names,
+        pool_size=INFERENCE_WORKERS, num_threads=RUNTIME_SETTINGS["backend_threads"]
+    )
+    if [b.name for b in candidates] == ["keras"]:
+        # Forced Keras, or nothing exported: serve the one Keras backend without probing it
+        backend, report = candidates[0], {}
+    elif INFERENCE_BACKEND != "auto":
+        # A forced backend is still parity-checked; Keras is only the fallback
+        forced = [b for b in candidates if b.name == INFERENCE_BACKEND]
+        keras_backend = next(b for b in candidates if b.name == "keras")
+        reference = keras_backend.predict(probe)
+        with backend_selection_lock:
+            backend, report = select_backend(forced, probe, reference=reference)
+        backend = backend or keras_backend
     else:
-        print(f"⚠️ {crop_type.title()} model not found at {config['model_path']}")
-        return False
+        with backend_selection_lock:
+            backend, report = select_backend(candidates, probe)
+    
+    report.update({name: {"skipped": reason} for name, reason in skipped.items()})
+    report.update(quantized_report)
+    print(f"✅ {crop_type.title()} inference backend: {backend.name} {report}")
+    return backend, {"selected": backend.name, "candidates": report}
+
+def get_shared_backbone():
+    """Load the shared backbone once (SHARED_BACKBONE mode)"""
+    global shared_backbone
+    with shared_backbone_lock:
+        if shared_backbone is None:
+            shared_backbone = SharedBackbone(MULTICROP_MODEL_DIR)
+            print(f"✅ Shared backbone loaded from {MULTICROP_MODEL_DIR}")
+        return shared_backbone
+
+def crop_model_config(crop_type):
+    """MODELS_CONFIG entry; in SHARED_BACKBONE mode the model is the crop's head"""
+    config = MODELS_CONFIG.get(crop_type)
+    if config and SHARED_BACKBONE:
+        paths = multicrop_paths(crop_type, MULTICROP_MODEL_DIR)
+        config = {**config, "model_path": paths["head"], "class_indices_path": paths["class_indices"]}
+    return config
+
+def model_version(path):
+    """Version id of a model file: its modification time and a short content hash"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    modified = time.strftime("%Y%m%d-%H%M%S", time.localtime(os.path.getmtime(path)))
+    return f"{modified}-{digest.hexdigest()[:8]}"
+
+def load_crop_metadata(crop_type: str):
+    """
+    Class indices, class names and disease info of a crop, or None
+    
+    Only the small JSON files; needs no model weights, so /classes and
+    /disease work for crops that are not (yet) loaded.
+    """
+    config = crop_model_config(crop_type)
     
     # Load class indices
-    if os.path.exists(config["class_indices_path"]):
-        with open(config["class_indices_path"], 'r') as f:
-            class_indices[crop_type] = json.load(f)
-        
-        # Handle both formats: {"class_name": 0} or {"0": "class_name"}
-        first_key = next(iter(class_indices[crop_type].keys()))
-        if first_key.isdigit():
-            # Format: {"0": "class_name"} - already correct
-            class_names[crop_type] = {int(k): v for k, v in class_indices[crop_type].items()}
-        else:
-            # Format: {"class_name": 0} - need to swap
-            class_names[crop_type] = {v: k for k, v in class_indices[crop_type].items()}
-        
-        print(f"✅ {crop_type.title()} class indices loaded: {list(class_names[crop_type].values())}")
-    else:
+    if not os.path.exists(config["class_indices_path"]):
         print(f"⚠️ {crop_type.title()} class indices not found")
-        return False
+        return None
+    with open(config["class_indices_path"], 'r') as f:
+        crop_class_indices = json.load(f)
+    
+    # Handle both formats: {"class_name": 0} or {"0": "class_name"}
+    first_key = next(iter(crop_class_indices.keys()))
+    if first_key.isdigit():
+        # Format: {"0": "class_name"} - already correct
+        crop_class_names = {int(k): v for k, v in crop_class_indices.items()}
+    else:
+        # Format: {"class_name": 0} - need to swap
+        crop_class_names = {v: k for k, v in crop_class_indices.items()}
+    print(f"✅ {crop_type.title()} class indices loaded: {list(crop_class_names.values())}")
     
     # Load disease info
     if os.path.exists(config["disease_info_path"]):
         with open(config["disease_info_path"], 'r', encoding='utf-8') as f:
-            disease_info[crop_type] = json.load(f)
+            crop_disease_info = json.load(f)
         print(f"✅ {crop_type.title()} disease info loaded")
     else:
         print(f"⚠️ {crop_type.title()} disease info not found, using defaults")
-        disease_info[crop_type] = {}
+        crop_disease_info = {}
+    
+    return {
+        "class_indices": crop_class_indices,
+        "class_names": crop_class_names,
+        "disease_info": crop_disease_info,
+        "class_table": build_class_table(crop_type, crop_class_names, crop_disease_info)
+    }
+
+def load_all_metadata():
+    """Class and disease metadata of every configured crop, whether or not its model loads"""
+    for crop_type in MODELS_CONFIG:
+        metadata = load_crop_metadata(crop_type)
+        if metadata is not None:
+            with model_swap_lock:
+                class_indices[crop_type] = metadata["class_indices"]
+                class_names[crop_type] = metadata["class_names"]
+                disease_info[crop_type] = metadata["disease_info"]
+                class_tables[crop_type] = metadata["class_table"]
+
+def build_crop_model(crop_type: str):
+    """
+    Load one version of a crop model with everything needed to serve it
+    
+    Returns a dict (model, serving backend, Grad-CAM engine, class names,
+    disease info, version, per-version batchers) or None. Nothing global
+    changes until install_crop_model, so a new version can be built while the
+    old one keeps serving.
+    """
+    config = crop_model_config(crop_type)
+    if not config:
+        print(f"⚠️ Unknown crop type: {crop_type}")
+        return None
     
+    print(f"\n🔄 Loading {crop_type} model and metadata...")
+    
+    if not os.path.exists(config["model_path"]):
+        print(f"⚠️ {crop_type.title()} model not found at {config['model_path']}")
+        return None
+    
+    # Re-read with every version: a retrained model may come with new classes
+    metadata = load_crop_metadata(crop_type)
+    if metadata is None:
+        return None
+    crop_class_indices = metadata["class_indices"]
+    crop_class_names = metadata["class_names"]
+    crop_disease_info = metadata["disease_info"]
+    
+    # Load model
+    version = model_version(config["model_path"])
+    source_mtime = os.path.getmtime(config["model_path"])
+    if SHARED_BACKBONE:
+        # Backbone -> this crop's head; the backbone layers are shared by every crop.
+        # Heads are keyed by version so an old one serves until it is retired
+        head_key = f"{crop_type}@{version}"
+        model = get_shared_backbone().crop_model(crop_type, head_key)
+    else:
+        model = keras.models.load_model(config["model_path"])
+    print(f"✅ {crop_type.title()} model {version} loaded from {config['model_path']}")
+    
+    # Build the Grad-CAM engine once, instead of per request
+    try:
+        engine = GradCAMEngine(model)
+        print(f"✅ {crop_type.title()} Grad-CAM engine ready")
+    except Exception as e:
+        engine = None
+        print(f"⚠️ {crop_type.title()} Grad-CAM engine unavailable ({e}), using per-request Grad-CAM")
+    
+    if SHARED_BACKBONE:
+        backend = CropHeadBackend(shared_backbone, head_key)
+        backend_report = {"selected": "shared", "candidates": {}}
+    else:
+        backend, backend_report = choose_backend(crop_type, config["model_path"], with_uint8_input(model))
+    
+    return {
+        "crop_type": crop_type,
+        "version": version,
+        "source": config["model_path"],
+        "source_mtime": source_mtime,
+        "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": model,
+        "backend": backend,
+        "backend_report": backend_report,
+        "engine": engine,
+        "class_indices": crop_class_indices,
+        "class_names": crop_class_names,
+        "disease_info": crop_disease_info,
+        "class_table": metadata["class_table"],
+        "batchers": {},
+        "in_flight": 0,
+        "retired": False
+    }
+
+def install_crop_model(crop_type, loaded):
+    """
+    Atomically make `loaded` the version new requests get
+    
+    The version it replaces is retired: requests already holding it finish on
+    it, then it is freed.
+    """
+    with model_swap_lock:
+        previous = loaded_models.get(crop_type)
+        loaded_models[crop_type] = loaded
+        class_indices[crop_type] = loaded["class_indices"]
+        class_names[crop_type] = loaded["class_names"]
+        disease_info[crop_type] = loaded["disease_info"]
+        class_tables[crop_type] = loaded["class_table"]
+    if previous is not None:
+        retire_crop_model(previous)
+    return previous
+
+def retire_crop_model(loaded):
+    """Free a replaced or evicted version once its in-flight requests have finished"""
+    with model_swap_lock:
+        loaded["retired"] = True
+        idle = loaded["in_flight"] == 0
+    if idle:
+        free_crop_model(loaded)
+
+def free_crop_model(loaded):
+    """Stop a retired version's batchers and drop its shared-backbone head"""
+    head_key = getattr(loaded["backend"], "head_key", None)
+    if shared_backbone is not None and head_key is not None:
+        # Only the head is dropped; the backbone serves the other crops
+        shared_backbone.unload_head(head_key)
+    for batcher in loaded["batchers"].values():
+        # Idle (nothing in flight on this version); stop its worker on the event loop
+        if main_loop is not None:
+            main_loop.call_soon_threadsafe(lambda batcher=batcher: asyncio.ensure_future(batcher.stop()))
+    loaded["batchers"] = {}
+
+def load_crop_model(crop_type: str):
+    """Load model and metadata for a specific crop type"""
+    loaded = build_crop_model(crop_type)
+    if loaded is None:
+        return False
+    install_crop_model(crop_type, loaded)
+    return True
+
+def unload_crop_model(crop_type: str):
+    """
+    Drop a crop's current version (model, Grad-CAM engine, serving backend and
+    batchers)
+    
+    Class names and disease info are small and stay loaded.
+    """
+    with model_swap_lock:
+        loaded = loaded_models.pop(crop_type, None)
+    if loaded is None:
+        # Cleanup after a failed load; nothing was installed
+        warmup_state.pop(crop_type, None)
+        return
+    warmup_state[crop_type] = {"status": "evicted"}
+    retire_crop_model(loaded)
+
+def crop_model_bytes(crop_type: str):
+    """
+    Estimated resident size of a crop: Keras weights plus the serving artifact
+    
+    With SHARED_BACKBONE only the crop's head counts; the backbone is not evictable.
+    """
+    loaded = loaded_models[crop_type]
+    backend = loaded["backend"]
+    if shared_backbone is not None:
+        return shared_backbone.head_bytes(backend.head_key)
+    weights = sum(int(np.prod(w.shape)) * np.dtype(w.dtype).itemsize for w in loaded["model"].weights)
+    if backend.name == "keras":
+        return weights
+    # The Keras model stays loaded for Grad-CAM; the runtime holds its own copy of the artifact
+    return weights + artifact_bytes(backend.path)
+
+def load_and_warm_crop_model(crop_type: str):
+    """Registry loader: crops loaded on demand after startup are warmed before first use"""
+    if not load_crop_model(crop_type):
+        return False
+    if warmup_task is not None:
+        warm_crop(crop_type)
     return True
 
+model_registry = ModelRegistry(
+    load_and_warm_crop_model,
+    unload_crop_model,
+    crop_model_bytes,
+    memory_budget_bytes=MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
+    pinned=PINNED_CROPS
+)
+
+def startup_crops():
+    """Crops loaded (and required for readiness) at startup; none in a multi-worker HTTP worker"""
+    if inference_client is not None:
+        return []
+    return [crop for crop in MODELS_CONFIG if not LAZY_MODEL_LOADING or crop in PINNED_CROPS]
+
+async def acquire_crop_model(crop: str):
+    """
+    Mark a crop model in use (not evictable), loading it first if needed
+    
+    Returns the crop's current version; the request uses it to the end, even
+    if a hot reload swaps in a newer one meanwhile. Raises 503 if it cannot be
+    loaded; callers must release_crop_model() what they get.
+    """
+    if inference_client is not None:
+        return await acquire_remote_model(crop)
+    if model_registry.try_acquire(crop) or await asyncio.to_thread(model_registry.acquire, crop):
+        with model_swap_lock:
+            loaded = loaded_models.get(crop)
+            if loaded is not None:
+                loaded["in_flight"] += 1
+                return loaded
+        model_registry.release(crop)
+    raise HTTPException(
+        status_code=503,
+        detail=f"{crop.title()} model not loaded. Please ensure the model is trained and available."
+    )
+
+def release_crop_model(loaded):
+    """End a request's use of a model version (freeing it if it was retired meanwhile)"""
+    if loaded.get("remote"):
+        return
+    with model_swap_lock:
+        loaded["in_flight"] -= 1
+        idle = loaded["retired"] and loaded["in_flight"] == 0
+    if idle:
+        free_crop_model(loaded)
+    model_registry.release(loaded["crop_type"])
+
+def remote_model_info(loaded):
+    """What a multi-worker HTTP worker needs to know about a version the server serves"""
+    return {
+        key: loaded[key]
+        for key in ("crop_type", "version", "source", "loaded_at", "backend_report",
+                    "class_indices", "class_names", "disease_info", "class_table")
+    }
+
+async def acquire_remote_model(crop: str):
+    """
+    Multi-worker mode: the server's current version of a crop, as a record
+    without a model (metadata is fetched once per version)
+    """
+    loaded = loaded_models.get(crop)
+    if loaded is not None:
+        return loaded
+    try:
+        info = await inference_client.call("model", crop_type=crop)
+    except InferenceServerError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    loaded = {
+        **info,
+        "model": None,
+        "backend": None,
+        "engine": None,
+        "batchers": {},
+        "remote": True
+    }
+    with model_swap_lock:
+        loaded_models[crop] = loaded
+        class_indices[crop] = loaded["class_indices"]
+        class_names[crop] = loaded["class_names"]
+        disease_info[crop] = loaded["disease_info"]
+        class_tables[crop] = loaded["class_table"]
+    return loaded
+
+def forget_remote_model(loaded, version):
+    """The server answered with another version (hot reload): refetch metadata on the next request"""
+    if version != loaded["version"]:
+        with model_swap_lock:
+            if loaded_models.get(loaded["crop_type"]) is loaded:
+                del loaded_models[loaded["crop_type"]]
+
+async def fetch_remote_models():
+    """Multi-worker mode: fetch every crop's metadata once the inference server is up"""
+    pending = list(MODELS_CONFIG)
+    while pending:
+        for crop in list(pending):
+            try:
+                await acquire_remote_model(crop)
+                pending.remove(crop)
+            except HTTPException as e:
+                # Server not up yet: retry. Any other error (no model for the crop) is left
+                # for the crop's next request
+                if "unavailable" not in str(e.detail):
+                    pending.remove(crop)
+        if pending:
+            await asyncio.sleep(1)
+
+def reload_crop_model(crop_type: str):
+    """
+    Hot reload: build the crop's current model file next to the serving
+    version, warm it, then swap it in
+    
+    Crops that are not resident are left alone (their next load reads the new
+    file). Returns a status dict.
+    """
+    result = {"crop_type": crop_type}
+    # Keeps the serving version from being evicted during the reload
+    if not model_registry.try_acquire(crop_type):
+        return {**result, "status": "not_loaded"}
+    try:
+        with reload_lock:
+            current = loaded_models[crop_type]
+            result["previous_version"] = current["version"]
+            config = crop_model_config(crop_type)
+            if not os.path.exists(config["model_path"]):
+                return {**result, "status": "failed", "error": f"{config['model_path']} not found"}
+            if model_version(config["model_path"]) == current["version"]:
+                return {**result, "status": "unchanged", "version": current["version"]}
+            
+            started = time.perf_counter()
+            loaded = None
+            try:
+                loaded = build_crop_model(crop_type)
+                if loaded is None:
+                    return {**result, "status": "failed", "error": "model or metadata could not be loaded"}
+                timings = warm_up_crop(loaded)
+            except Exception as e:
+                if loaded is not None:
+                    free_crop_model(loaded)
+                print(f"⚠️ {crop_type.title()} reload failed, keeping {current['version']}: {e}")
+                return {**result, "status": "failed", "error": str(e)}
+            
+            install_crop_model(crop_type, loaded)
+            warmup_state[crop_type] = {
+                "status": "warm",
+                "total_ms": round((time.perf_counter() - started) * 1000, 3),
+                "timings_ms": timings
+            }
+            model_registry.resize(crop_type, crop_model_bytes(crop_type))
+            print(f"🔁 {crop_type.title()} model swapped: {current['version']} -> {loaded['version']}")
+            return {**result, "status": "reloaded", "version": loaded["version"],
+                    "seconds": round(time.perf_counter() - started, 3)}
+    finally:
+        model_registry.release(crop_type)
+
+async def watch_model_files():
+    """Hot-reload resident crops whose model file changes (MODEL_WATCH_INTERVAL > 0)"""
+    attempted = {}
+    while True:
+        await asyncio.sleep(MODEL_WATCH_INTERVAL)
+        for crop, loaded in list(loaded_models.items()):
+            try:
+                mtime = os.path.getmtime(crop_model_config(crop)["model_path"])
+            except OSError:
+                continue
+            # Each new file is tried once; a failed or unchanged one is not retried
+            if mtime in (loaded["source_mtime"], attempted.get(crop)):
+                continue
+            # Modified during the last interval: it may still be being written
+            if time.time() - mtime < MODEL_WATCH_INTERVAL:
+                continue
+            attempted[crop] = mtime
+            await asyncio.to_thread(reload_crop_model, crop)
+
 def load_all_models():
-    """Load all available models"""
+    """
+    Load all available models concurrently
+    
+    The crop disease models, the crop suitability model and the yield
+    predictor each load on their own thread, so cold start is bounded by the
+    slowest artifact. Per-artifact load times are kept in load_timings.
+    """
     print("=" * 60)
     print("🌾🍵 Loading All Crop Disease Models")
     print("=" * 60)
     
-    results = {}
-    for crop_type in MODELS_CONFIG.keys():
-        results[crop_type] = load_crop_model(crop_type)
+    load_all_metadata()
     
-    return results
-
-def preprocess_image(image_bytes):
-    """Preprocess image for model prediction"""
-    # Open image
-    image = Image.open(io.BytesIO(image_bytes))
+    loaders = {crop_type: (lambda crop_type=crop_type: model_registry.preload(crop_type)) for crop_type in startup_crops()}
+    loaders["crop_suitability"] = lambda: load_suitability_model() is not None
+    loaders["yield_predictor"] = lambda: get_yield_predictor() is not None
     
-    # Convert to RGB if necessary
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+    def timed_load(name, loader):
+        started = time.perf_counter()
+        try:
+            loaded = bool(loader())
+        except Exception as e:
+            print(f"⚠️ Failed to load {name}: {e}")
+            loaded = False
+        load_timings[name] = {"loaded": loaded, "seconds": round(time.perf_counter() - started, 3)}
+        return loaded
     
-    # Resize
-    image = image.resize(IMAGE_SIZE, Image.Resampling.LANCZOS)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(loaders), thread_name_prefix="loader") as pool:
+        futures = {name: pool.submit(timed_load, name, loader) for name, loader in loaders.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    load_timings["total"] = {"seconds": round(time.perf_counter() - started, 3)}
     
-    # Convert to numpy array and normalize
-    img_array = np.array(image) / 255.0
+    print(f"⏱️ Models loaded in {load_timings['total']['seconds']}s: " + ", ".join(
+        f"{name} {timing['seconds']}s" for name, timing in load_timings.items() if name != "total"
+    ))
+    return {crop_type: results[crop_type] for crop_type in startup_crops()}
+
+def get_batcher(loaded, explain: bool = True):
+    """
+    Get (or create) the micro-batcher that serves forward passes for a crop
+    model version
+
+    With a Grad-CAM engine, explain batches return (predictions, classes, heatmaps)
+    and plain batches return (predictions, conv activations) when Keras is the
+    selected backend. Otherwise batches return predictions only, from the
+    selected inference backend.
+    """
+    mode = "explain" if explain else "predict"
+    if mode not in loaded["batchers"]:
+        engine = loaded["engine"]
+        backend = loaded["backend"]
+        if engine is not None and explain:
+            # Fused path: probabilities, class and heatmap from one taped pass
+            predict_fn = engine.predict_with_explanation
+        elif engine is not None and backend.name == "keras":
+            # Forward only; activations are cached for a later /gradcam call
+            predict_fn = engine.predict_with_activations
+        else:
+            # A faster runtime; a later /gradcam call recomputes from the image
+            predict_fn = backend.predict
+        loaded["batchers"][mode] = MicroBatcher(
+            f"{loaded['crop_type']}:{mode}",
+            predict_fn,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_WINDOW_MS,
+            executor=executor.pool
+        )
+    return loaded["batchers"][mode]
+
+def all_batchers():
+    """Every live batcher by name: cross-crop ones and those of the serving versions"""
+    named = dict(batchers)
+    for loaded in list(loaded_models.values()):
+        named.update({batcher.name: batcher for batcher in list(loaded["batchers"].values())})
+    return named
+
+def collate_crop_images(items):
+    """(image, head) items -> (stacked images, head per row) for the shared batcher"""
+    return np.stack([image for image, _ in items]), [head_key for _, head_key in items]
+
+def get_shared_batcher():
+    """Cross-crop micro-batcher: one backbone pass for forward-only requests of every crop"""
+    key = "shared:predict"
+    if key not in batchers:
+        batchers[key] = MicroBatcher(
+            key,
+            lambda batch: shared_backbone.predict_mixed(*batch),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_WINDOW_MS,
+            executor=executor.pool,
+            collate_fn=collate_crop_images
+        )
+    return batchers[key]
+
+async def submit_image(loaded, image, explain):
+    """
+    Queue one uint8 image on the right micro-batcher and wait for its outputs
+    
+    With SHARED_BACKBONE, forward-only images of any crop are batched together
+    and return (predictions, backbone activations).
+    """
+    if inference_client is not None:
+        reply = await inference_client.call("submit", images=[image], crop_type=loaded["crop_type"], explain=explain)
+        forget_remote_model(loaded, reply["version"])
+        return reply["outputs"]
+    if SHARED_BACKBONE and not explain:
+        return await get_shared_batcher().submit((image, loaded["backend"].head_key))
+    return await get_batcher(loaded, explain).submit(image)
+
+async def submit_image_outputs(loaded, image, explain):
+    """
+    submit_image for the inference server: always (predictions, class,
+    heatmap) with explain, else (predictions, activations or None)
+    """
+    outputs = await submit_image(loaded, image, explain)
+    if isinstance(outputs, tuple):
+        return outputs
+    if not explain:
+        return outputs, None
+    predicted_idx = int(np.argmax(outputs))
+    heatmap = await executor.run(generate_gradcam, loaded["model"], image[np.newaxis] / 255.0, predicted_idx)
+    return outputs, predicted_idx, heatmap
+
+async def read_upload(file, with_hash=False):
+    """
+    Validate an upload without reading it into memory
     
-    # Add batch dimension
-    img_array = np.expand_dims(img_array, axis=0)
+    Starlette has already spooled the body (to disk past 1 MB). The declared
+    size is checked, the format sniffed from the first bytes and, with
+    `with_hash`, the content hash computed chunk by chunk. Returns (file
+    object at its start, hash or None); the decoder reads the file itself.
+    """
+    if file.size is not None:
+        preprocessor.check_size(file.size)
+    if not with_hash:
+        preprocessor.scan(file.file)
+        return file.file, None
+    hasher = content_hasher()
+    await asyncio.to_thread(preprocessor.scan, file.file, hasher, UPLOAD_CHUNK_BYTES)
+    return file.file, hasher.hexdigest()
+
+def preprocess_image(source, timings=None, with_hash=False):
+    """
+    Preprocess image for model prediction
     
-    return img_array, image
+    `source` is the upload's bytes or file object. Uses reduced-resolution
+    JPEG decoding and rejects oversized or malformed uploads (ImageRejected).
+    Stage timings (ms) are written to `timings`. With `with_hash`, the
+    perceptual hash of the resized image is returned too.
+    """
+    img_array, image = preprocessor.preprocess(source, timings)
+    if not with_hash:
+        return img_array, image
+    started = time.perf_counter()
+    phash = difference_hash(image)
+    if timings is not None:
+        timings["phash"] = (time.perf_counter() - started) * 1000
+    return img_array, image, phash
 
 def generate_gradcam(model, img_array, class_idx, layer_name=None):
     """
     Generate Grad-CAM heatmap for the predicted class
     Works with MobileNetV2 architecture
+    
+    Legacy per-request path: expects float images scaled to [0, 1]
     """
     try:
         # For MobileNetV2, get the last conv layer from the base model
@@ -276,11 +1018,25 @@ def generate_simple_attention(model, img_array, class_idx):
         print(f"⚠️ Attention map error: {str(e)}")
         return None
 
-def create_gradcam_overlay(original_image, heatmap, alpha=0.4):
+def encode_image(image, image_format="png", quality=GRADCAM_QUALITY, as_base64=True):
+    """Encode a PIL image as PNG, JPEG or WebP bytes (base64 string by default)"""
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, format='PNG')
+    elif image_format == "jpeg":
+        image.save(buffer, format='JPEG', quality=quality)
+    else:
+        image.save(buffer, format='WEBP', quality=quality, method=0)
+    
+    if as_base64:
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return buffer.getvalue()
+
+def create_gradcam_overlay(original_image, heatmap, alpha=0.4, image_format="png", quality=GRADCAM_QUALITY, as_base64=True):
     """
     Overlay Grad-CAM heatmap on original image
     
-    Returns base64 encoded image
+    Returns base64 encoded image (raw bytes if as_base64=False)
     """
     # Convert PIL image to numpy array
     img_array = np.array(original_image)
@@ -295,15 +1051,9 @@ def create_gradcam_overlay(original_image, heatmap, alpha=0.4):
     # Overlay heatmap on original image
     overlay = np.uint8(img_array * (1 - alpha) + heatmap_colored * alpha)
     
-    # Convert to base64
-    overlay_image = Image.fromarray(overlay)
-    buffer = io.BytesIO()
-    overlay_image.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return encode_image(Image.fromarray(overlay), image_format, quality, as_base64)
 
-def create_heatmap_only(heatmap):
+def create_heatmap_only(heatmap, image_format="png", quality=GRADCAM_QUALITY, as_base64=True):
     """Create standalone heatmap image as base64"""
     # Resize to standard size
     heatmap_resized = cv2.resize(heatmap, IMAGE_SIZE)
@@ -312,21 +1062,451 @@ def create_heatmap_only(heatmap):
     heatmap_colored = cv2.applyColorMap(np.uint8(255 * heatmap_resized), cv2.COLORMAP_JET)
     heatmap_colored = cv2.cvtColor(heatmap_colored, cv2.COLOR_BGR2RGB)
     
-    # Convert to base64
-    heatmap_image = Image.fromarray(heatmap_colored)
-    buffer = io.BytesIO()
-    heatmap_image.save(buffer, format='PNG')
-    buffer.seek(0)
+    return encode_image(Image.fromarray(heatmap_colored), image_format, quality, as_base64)
+
+def build_gradcam_data(original_image, heatmap, image_format="png", quality=GRADCAM_QUALITY, binary=False):
+    """
+    Encode the Grad-CAM overlay and heatmap images
+    
+    - png/jpeg/webp: overlay and heatmap images (base64, or bytes when binary)
+    - raw: the uint8 heatmap at conv resolution (e.g. 7x7) for client-side colouring
+    """
+    if heatmap is None:
+        return None
+    
+    if image_format == "raw":
+        raw = np.uint8(np.clip(heatmap, 0, 1) * 255)
+        return {
+            "format": "raw",
+            "mime_type": GRADCAM_MIME_TYPES["raw"],
+            "shape": list(raw.shape),
+            "heatmap": raw.tobytes() if binary else raw.tolist()
+        }
+    
+    as_base64 = not binary
+    return {
+        "format": image_format,
+        "mime_type": GRADCAM_MIME_TYPES[image_format],
+        "overlay": create_gradcam_overlay(original_image, heatmap, image_format=image_format, quality=quality, as_base64=as_base64),
+        "heatmap": create_heatmap_only(heatmap, image_format=image_format, quality=quality, as_base64=as_base64)
+    }
+
+def gradcam_response(payload, multipart=False):
+    """
+    JSON response, or multipart/mixed with the JSON first and each Grad-CAM
+    image as its own binary part (no base64 inflation)
+    """
+    if not multipart:
+        return JSONResponse(payload)
+    
+    parts = []
+    gradcam = payload.get("gradcam")
+    if gradcam:
+        for name in ("overlay", "heatmap"):
+            if isinstance(gradcam.get(name), bytes):
+                parts.append((name, gradcam["mime_type"], gradcam.pop(name)))
+        gradcam["parts"] = [name for name, _, _ in parts]
+    
+    boundary = uuid.uuid4().hex
+    body = [
+        f"--{boundary}\r\nContent-Type: application/json\r\nContent-Disposition: inline; name=\"result\"\r\n\r\n".encode(),
+        json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+        b"\r\n"
+    ]
+    for name, mime_type, content in parts:
+        body.append(
+            f"--{boundary}\r\nContent-Type: {mime_type}\r\nContent-Disposition: attachment; name=\"{name}\"\r\n\r\n".encode()
+        )
+        body.extend([content, b"\r\n"])
+    body.append(f"--{boundary}--\r\n".encode())
     
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return Response(content=b"".join(body), media_type=f"multipart/mixed; boundary={boundary}")
+
+def record_image(record):
+    """Resized image of an explanation record (decoded now for result-cache hits)"""
+    if record["image"] is None:
+        _, record["image"] = preprocess_image(record["image_bytes"])
+    return record["image"]
+
+def cached_heatmap(record, loaded):
+    """
+    Heatmap for a prediction made with explain=false, from its cached record
+    
+    Cached activations are only reused by the model version that produced
+    them; after a hot reload the heatmap is recomputed from the image.
+    """
+    engine = loaded["engine"]
+    if engine is not None and record["activations"] is not None and record["version"] == loaded["version"]:
+        return engine.heatmap_from_activations(record["activations"], record["class_idx"])
+    img_array = np.asarray(record_image(record), dtype=np.uint8)[np.newaxis]
+    if engine is not None:
+        return engine.heatmap(img_array, record["class_idx"])
+    return generate_gradcam(loaded["model"], img_array / 255.0, record["class_idx"])
+
+
+def build_class_table(crop_type, crop_class_names, crop_disease_info):
+    """
+    Per-class metadata of a crop version, built once at load time
+    
+    Top-k responses refer to classes by id into this table; clients fetch it
+    from /classes/{crop_type}/metadata and revalidate with its ETag, which
+    only changes when the classes or their disease info do.
+    """
+    classes = []
+    for idx in sorted(crop_class_names):
+        name = crop_class_names[idx]
+        info = crop_disease_info.get(name, {})
+        classes.append({
+            "id": idx,
+            "class": name,
+            "si_name": info.get("si_name", name),
+            "description": info.get("description", ""),
+            "treatment": info.get("treatment", []),
+            "severity": info.get("severity", "unknown")
+        })
+    body = json.dumps({"crop_type": crop_type, "classes": classes}, ensure_ascii=False).encode("utf-8")
+    return {"classes": classes, "body": body, "etag": f'"{content_hash(body)}"'}
+
+def describe_prediction(loaded, predictions, top_k=0):
+    """
+    Top class, disease info and sorted class probabilities for one image
+    
+    With `top_k`, only the k most likely class ids and probabilities are
+    returned; names and disease info come from the crop's class table.
+    """
+    predictions = np.asarray(predictions)
+    predicted_idx = int(np.argmax(predictions))
+    table = loaded["class_table"]
+    
+    if top_k:
+        k = min(top_k, predictions.size)
+        top = np.argpartition(-predictions, k - 1)[:k]
+        # Most likely first, ties by class id, so the first entry is the argmax class
+        top = top[np.lexsort((top, -predictions[top]))]
+        if top[0] != predicted_idx:
+            top = np.concatenate(([predicted_idx], top[top != predicted_idx][:k - 1]))
+        return predicted_idx, {
+            "class_id": predicted_idx,
+            "prediction": table["classes"][predicted_idx]["class"],
+            "confidence": float(predictions[predicted_idx]),
+            "top_k": [{"class_id": int(idx), "probability": float(predictions[idx])} for idx in top],
+            "classes_etag": table["etag"]
+        }
+    
+    entry = table["classes"][predicted_idx]
+    order = np.argsort(-predictions, kind="stable")
+    all_preds = [
+        {"class": table["classes"][idx]["class"], "probability": float(predictions[idx])}
+        for idx in order
+    ]
+    
+    return predicted_idx, {
+        "prediction": entry["class"],
+        "confidence": float(predictions[predicted_idx]),
+        "si_name": entry["si_name"],
+        "description": entry["description"],
+        "treatment": entry["treatment"],
+        "severity": entry["severity"],
+        "all_predictions": all_preds
+    }
+
+def explanation_record(loaded, predicted_idx, original_image, activations, image_bytes=None):
+    """What /predict/{prediction_id}/gradcam needs to explain a prediction later"""
+    return {
+        "crop_type": loaded["crop_type"],
+        "version": loaded["version"],
+        "prediction": loaded["class_table"]["classes"][predicted_idx]["class"],
+        "class_idx": predicted_idx,
+        "image": original_image,
+        "image_bytes": image_bytes,
+        "activations": activations
+    }
+
+async def remember_for_explanation(loaded, predicted_idx, original_image, activations, image_bytes=None):
+    """
+    Cache what /predict/{prediction_id}/gradcam needs; returns the prediction id
+    
+    Cached results pass the upload bytes instead of the decoded image. In
+    multi-worker mode records are kept by the inference server, so any
+    worker can answer the later /gradcam call.
+    """
+    record = explanation_record(loaded, predicted_idx, original_image, activations, image_bytes)
+    if inference_client is not None:
+        return await inference_client.call("remember", record=record)
+    return store_explanation(record)
+
+async def submit_unexplained(loaded, image, original_image):
+    """
+    submit_image with explain=false that also remembers the prediction for
+    a later /gradcam call: (predictions, prediction_id)
+    
+    In multi-worker mode the inference server keeps the record as it makes
+    the prediction, so neither the activations nor the image travel between
+    it and the worker.
+    """
+    if inference_client is not None:
+        reply = await inference_client.call("submit", images=[image], crop_type=loaded["crop_type"], explain=False, remember=True)
+        forget_remote_model(loaded, reply["version"])
+        return reply["outputs"], reply["prediction_id"]
+    outputs = await submit_image(loaded, image, explain=False)
+    predictions, activations = outputs if isinstance(outputs, tuple) else (outputs, None)
+    record = explanation_record(loaded, int(np.argmax(predictions)), original_image, activations)
+    return predictions, store_explanation(record)
+
+def store_explanation(record):
+    prediction_id = uuid.uuid4().hex
+    explanation_cache.set(prediction_id, record)
+    return prediction_id
+
+async def explanation_heatmap(prediction_id):
+    """
+    The record and heatmap of a prediction made with explain=false (None if
+    unknown or expired); the heatmap is computed on the inference server in
+    multi-worker mode
+    """
+    if inference_client is not None:
+        return await inference_client.call("explanation", prediction_id=prediction_id)
+    record = explanation_cache.get(prediction_id)
+    if record is None:
+        return None
+    loaded = await acquire_crop_model(record["crop_type"])
+    try:
+        heatmap = await executor.run(cached_heatmap, record, loaded)
+    finally:
+        release_crop_model(loaded)
+    return record, heatmap
+
+def result_cache_key(loaded, upload_hash, options):
+    """
+    Result cache key: crop, model version, response variant and upload hash (read_upload)
+    
+    The version changes on every hot reload, so stale results are never served.
+    """
+    if options["explain"]:
+        variant = f"gradcam-{options['gradcam_format']}-{options['gradcam_quality']}-{'bin' if options['multipart'] else 'b64'}"
+    else:
+        variant = "predict"
+    if options["top_k"]:
+        variant += f"-top{options['top_k']}"
+    return f"{loaded['crop_type']}:{loaded['version']}:{variant}:{upload_hash}"
+
+async def lookup_result(key):
+    if result_cache is None:
+        return None
+    if result_cache.disk is None:
+        return result_cache.get(key)
+    # SQLite lookups stay off the event loop
+    return await asyncio.to_thread(result_cache.get, key)
+
+async def store_result(key, value):
+    if result_cache is None:
+        return
+    if result_cache.disk is None:
+        result_cache.set(key, value)
+    else:
+        await asyncio.to_thread(result_cache.set, key, value)
+
+def predict_probabilities(loaded, img_batch):
+    """Class probabilities for a stacked uint8 batch in one forward pass"""
+    return loaded["backend"].predict(img_batch)
+
+async def run_predict_probabilities(loaded, img_batch):
+    """predict_probabilities on the executor, or on the inference server in multi-worker mode"""
+    if inference_client is None:
+        return await executor.run(predict_probabilities, loaded, img_batch)
+    reply = await inference_client.call("predict", images=img_batch, crop_type=loaded["crop_type"])
+    forget_remote_model(loaded, reply["version"])
+    return reply["probabilities"]
+
+def aggregate_field_predictions(loaded, probabilities):
+    """
+    Field verdict from the class probabilities of many leaves from one plot
+    
+    Prevalence is the share of images whose top class is that class.
+    """
+    top_idx = np.argmax(probabilities, axis=1)
+    top_conf = probabilities[np.arange(len(top_idx)), top_idx]
+    counts = np.bincount(top_idx, minlength=probabilities.shape[1])
+    mean_probs = probabilities.mean(axis=0)
+    total = len(top_idx)
+    
+    classes = []
+    for idx in np.flatnonzero(counts):
+        name = loaded["class_names"][int(idx)]
+        info = loaded["disease_info"].get(name, {})
+        confs = top_conf[top_idx == idx]
+        classes.append({
+            "class": name,
+            "si_name": info.get("si_name", name),
+            "severity": info.get("severity", "unknown"),
+            "count": int(counts[idx]),
+            "prevalence": round(float(counts[idx]) / total, 4),
+            "mean_confidence": float(confs.mean()),
+            "max_confidence": float(confs.max()),
+            "mean_probability": float(mean_probs[idx])
+        })
+    classes.sort(key=lambda c: (c["count"], c["mean_confidence"]), reverse=True)
+    
+    affected = [c for c in classes if c["severity"] != "none"]
+    significant = [c for c in affected if c["prevalence"] >= FIELD_MIN_PREVALENCE]
+    field_severity = max(
+        (c["severity"] for c in significant),
+        key=lambda level: SEVERITY_RANK.get(level, 1),
+        default="none"
+    )
+    dominant = classes[0]
+    
+    return {
+        "verdict": {
+            "prediction": dominant["class"],
+            "si_name": dominant["si_name"],
+            "prevalence": dominant["prevalence"],
+            "severity": field_severity,
+            "affected_fraction": round(sum(c["count"] for c in affected) / total, 4)
+        },
+        "classes": classes,
+        "mean_confidence": float(top_conf.mean()),
+        "max_confidence": float(top_conf.max())
+    }
+
+def saturated_response(e: ExecutorSaturated):
+    """503 telling the client when to retry"""
+    return HTTPException(
+        status_code=503,
+        detail="Service is busy processing other images. Please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def warm_up_crop(loaded):
+    """
+    Push synthetic batches through every inference path of a crop model version
+    
+    Covers the serving backend, the fused and forward-only Grad-CAM engine
+    passes, both heatmap functions and the Grad-CAM image encoders, so the
+    first real request does not pay for tracing or allocation.
+    Returns {path: {batch_size: ms} or ms}.
+    """
+    shape = (*IMAGE_SIZE, 3)
+    timings = {"serving": warm_up(loaded["backend"].predict, shape, WARMUP_BATCH_SIZES)}
+    
+    started = time.perf_counter()
+    image = np.zeros((1, *shape), dtype=np.uint8)
+    engine = loaded["engine"]
+    if engine is not None:
+        timings["explain"] = warm_up(engine.predict_with_explanation, shape, WARMUP_BATCH_SIZES)
+        timings["activations"] = warm_up(engine.predict_with_activations, shape, WARMUP_BATCH_SIZES)
+        started = time.perf_counter()
+        _, activations = engine.predict_with_activations(image)
+        engine.heatmap_from_activations(activations[0], 0)
+        heatmap = engine.heatmap(image, 0)
+    else:
+        heatmap = generate_gradcam(loaded["model"], image / 255.0, 0)
+    
+    placeholder = Image.fromarray(image[0])
+    for image_format in ("png", "webp"):
+        build_gradcam_data(placeholder, heatmap, image_format)
+    timings["gradcam"] = round((time.perf_counter() - started) * 1000, 3)
+    return timings
+
+def warm_crop(crop_type):
+    """Warm one crop and record its status and timings in warmup_state"""
+    loaded = loaded_models.get(crop_type)
+    if loaded is None:
+        return
+    warmup_state[crop_type] = {"status": "warming"}
+    started = time.perf_counter()
+    try:
+        timings = warm_up_crop(loaded)
+    except Exception as e:
+        warmup_state[crop_type] = {"status": "failed", "error": str(e)}
+        print(f"⚠️ {crop_type.title()} warm-up failed: {e}")
+        return
+    warmup_state[crop_type] = {
+        "status": "warm",
+        "total_ms": round((time.perf_counter() - started) * 1000, 3),
+        "timings_ms": timings
+    }
+    print(f"✅ {crop_type.title()} warm for batch sizes {WARMUP_BATCH_SIZES}")
+
+async def warm_up_models():
+    """Warm every loaded crop on the executor; /ready flips once all are warm"""
+    for crop in list(loaded_models):
+        warmup_state[crop] = {"status": "pending"}
+    await asyncio.gather(*[executor.run(warm_crop, crop) for crop in list(loaded_models)])
+
+def crop_status(crop):
+    """Warm-up status of a crop, or why it is not loaded"""
+    status = warmup_state.get(crop, {}).get("status")
+    if crop in loaded_models:
+        # Reloaded after an eviction and not warmed yet
+        return "pending" if status in (None, "evicted") else status
+    if status is not None:
+        return status
+    if load_timings.get(crop, {}).get("loaded") is False:
+        return "failed" if os.path.exists(crop_model_config(crop)["model_path"]) else "missing"
+    return "not_loaded"
+
+def readiness():
+    """
+    Per-crop warm-up status; ready once every crop that loaded at startup
+    (all configured crops, or the pinned ones with LAZY_MODEL_LOADING) is warm
+    
+    Crops whose model is missing or failed to load are reported, but do not
+    hold readiness back; the service serves the others. So do crops evicted
+    over MODEL_MEMORY_BUDGET_MB: they load again on their next request.
+    """
+    crops = {crop: crop_status(crop) for crop in MODELS_CONFIG.keys()}
+    loaded_at_startup = [crop for crop in startup_crops() if load_timings.get(crop, {}).get("loaded") is not False]
+    required = model_registry.expected_resident(loaded_at_startup)
+    return all(crops[crop] == "warm" for crop in required), crops
+
+async def service_readiness():
+    """readiness(), from the inference server in multi-worker mode"""
+    if inference_client is None:
+        return readiness()
+    try:
+        status = await inference_client.call("status")
+    except InferenceServerError:
+        return False, {crop: "server_unavailable" for crop in MODELS_CONFIG}
+    return status["ready"], status["crops"]
+
+def server_status():
+    """Readiness, crops and model metrics, as the inference server reports them to workers"""
+    ready, crops = readiness()
+    return {"ready": ready, "crops": crops, "models": crop_summaries(), "metrics": model_metrics()}
 
 @app.on_event("startup")
 async def startup_event():
-    """Load all models on startup"""
+    """Load all models on startup, then warm them up in the background"""
+    global warmup_task, watch_task, main_loop, inference_client
+    main_loop = asyncio.get_running_loop()
+    if INFERENCE_SERVER_SOCKET:
+        # Multi-worker HTTP worker: crop models live in the inference server
+        ring = ImageRing(INFERENCE_SHM_SLOTS, (*IMAGE_SIZE, 3)) if INFERENCE_SHM_SLOTS > 0 else None
+        inference_client = InferenceClient(INFERENCE_SERVER_SOCKET, INFERENCE_SERVER_TIMEOUT, ring)
+        load_all_models()
+        warmup_task = asyncio.create_task(fetch_remote_models())
+        print(f"🔌 Worker {os.getpid()} using the inference server at {INFERENCE_SERVER_SOCKET}")
+        return
     results = load_all_models()
     for crop, success in results.items():
         if not success:
             print(f"⚠️ {crop.title()} model loading failed. Please train the model first.")
+    warmup_task = asyncio.create_task(warm_up_models())
+    if MODEL_WATCH_INTERVAL > 0:
+        watch_task = asyncio.create_task(watch_model_files())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop warm-up, the model file watcher and batching workers"""
+    for task in (warmup_task, watch_task):
+        if task is not None:
+            task.cancel()
+    for batcher in all_batchers().values():
+        await batcher.stop()
+    if inference_client is not None:
+        await inference_client.close()
+    executor.shutdown()
 
 @app.get("/")
 async def root():
@@ -336,7 +1516,7 @@ async def root():
         "service": "Govi Isuru Multi-Crop Disease Predictor",
         "version": "3.0.0",
         "supported_crops": list(MODELS_CONFIG.keys()),
-        "models_loaded": {crop: (crop in models) for crop in MODELS_CONFIG.keys()},
+        "models_loaded": {crop: (crop in loaded_models) for crop in MODELS_CONFIG.keys()},
         "classes": {
             crop: list(class_indices.get(crop, {}).values()) 
             for crop in MODELS_CONFIG.keys()
@@ -345,31 +1525,131 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (liveness; see /ready for traffic readiness)"""
     return {
         "status": "healthy",
-        "models_loaded": {crop: (crop in models) for crop in MODELS_CONFIG.keys()}
+        "ready": (await service_readiness())[0],
+        "models_loaded": {crop: (crop in loaded_models) for crop in MODELS_CONFIG.keys()}
+    }
+
+@app.get("/ready")
+async def ready_check():
+    """Readiness: 200 once every configured crop model is loaded and warm, else 503"""
+    ready, crops = await service_readiness()
+    return JSONResponse({"ready": ready, "crops": crops}, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Inference metrics for tuning (queue depth, batch sizes, wait times)"""
+    metrics = {
+        "executor": executor.stats(),
+        "preprocessing": preprocessor.stats.to_dict(),
+        "explanation_cache": explanation_cache.stats(),
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "near_duplicates": near_duplicates.stats() if near_duplicates is not None else None
+    }
+    if inference_client is None:
+        return {**model_metrics(), **metrics}
+    # The worker has its own pinning and thread settings; the server's are in its model metrics
+    metrics["runtime"] = runtime_config.runtime_report(RUNTIME_SETTINGS)
+    # Multi-worker mode: this worker's request-side metrics plus the server's model metrics
+    try:
+        server = (await inference_client.call("status"))["metrics"]
+    except InferenceServerError as e:
+        server = {"error": str(e)}
+    return {**metrics, "worker_pid": os.getpid(), "inference_server": {"client": inference_client.stats(), **server}}
+
+def model_metrics():
+    """Batching, backend, registry, warm-up and runtime metrics of the process holding the models"""
+    return {
+        "batching": {name: batcher.stats() for name, batcher in all_batchers().items()},
+        "backends": {crop: loaded["backend_report"] for crop, loaded in list(loaded_models.items())},
+        "shared_backbone": {
+            "model_dir": MULTICROP_MODEL_DIR,
+            "backbone_bytes": shared_backbone.backbone_bytes,
+            "heads": sorted(shared_backbone.heads)
+        } if shared_backbone is not None else None,
+        "load_timings": load_timings,
+        "model_registry": model_registry.stats(),
+        "warmup": warmup_state,
+        "runtime": runtime_config.runtime_report(RUNTIME_SETTINGS)
     }
 
 @app.get("/crops")
 async def get_supported_crops():
-    """Get list of supported crop types"""
+    """Get list of supported crop types (with the serving model version of each)"""
+    if inference_client is not None:
+        try:
+            return {"crops": (await inference_client.call("status"))["models"]}
+        except InferenceServerError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"crops": crop_summaries()}
+
+def crop_summaries():
+    crops = []
+    for crop in MODELS_CONFIG.keys():
+        loaded = loaded_models.get(crop)
+        crops.append({
+            "type": crop,
+            "name": crop.title(),
+            "model_loaded": loaded is not None,
+            "pinned": crop in model_registry.pinned,
+            "version": loaded["version"] if loaded else None,
+            "loaded_at": loaded["loaded_at"] if loaded else None,
+            "backend": loaded["backend"].name if loaded else None,
+            "classes_count": len(class_names.get(crop, {}))
+        })
+    return crops
+
+def require_admin(x_admin_token: str = Header(default="")):
+    """Admin endpoints are off unless ADMIN_TOKEN is set, and then need it in X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled. Set ADMIN_TOKEN to enable them.")
+    if not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.post("/admin/models/{crop_type}/reload", dependencies=[Depends(require_admin)])
+async def reload_model(crop_type: CropType):
+    """
+    Hot-reload a crop model from its file without a restart
+    
+    The new version is loaded and warmed off the event loop while the current
+    one keeps serving, then swapped in atomically; requests already running
+    finish on the old version. Status: reloaded, unchanged (same file
+    contents), not_loaded (the next load reads the new file) or failed (the
+    old version keeps serving).
+    """
+    if inference_client is not None:
+        # The inference server holds the models; workers pick up the new version from its replies
+        try:
+            result = await inference_client.call("reload", crop_type=crop_type.value)
+        except InferenceServerError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+    else:
+        result = await asyncio.to_thread(reload_crop_model, crop_type.value)
+    return JSONResponse(result, status_code=500 if result["status"] == "failed" else 200)
+
+def prediction_options(
+    explain: bool = Query(default=True, description="Include Grad-CAM images; if false, fetch later from /predict/{prediction_id}/gradcam"),
+    gradcam_format: GradCAMFormat = Query(default=GradCAMFormat.png, description="png, jpeg, webp, or raw (uint8 heatmap at conv resolution)"),
+    gradcam_quality: int = Query(default=GRADCAM_QUALITY, ge=1, le=100, description="Quality for jpeg/webp"),
+    multipart: bool = Query(default=False, description="Return multipart/mixed with binary Grad-CAM parts instead of base64 JSON"),
+    top_k: int = Query(default=0, ge=0, description="Return only the k most likely class ids (see /classes/{crop_type}/metadata); 0 = full response")
+):
+    """Query options shared by all /predict endpoints"""
     return {
-        "crops": [
-            {
-                "type": crop,
-                "name": crop.title(),
-                "model_loaded": crop in models,
-                "classes_count": len(class_names.get(crop, {}))
-            }
-            for crop in MODELS_CONFIG.keys()
-        ]
+        "explain": explain,
+        "gradcam_format": gradcam_format.value,
+        "gradcam_quality": gradcam_quality,
+        "multipart": multipart,
+        "top_k": top_k
     }
 
 @app.post("/predict")
 async def predict_disease(
     file: UploadFile = File(...),
-    crop_type: CropType = Query(default=CropType.rice, description="Type of crop (rice,tea or chili)")
+    crop_type: CropType = Query(default=CropType.rice, description="Type of crop (rice,tea or chili)"),
+    options: dict = Depends(prediction_options)
 ):
     """
     Predict crop disease from uploaded image
@@ -377,21 +1657,25 @@ async def predict_disease(
     Parameters:
     - file: Image file
     - crop_type: Type of crop (rice or tea)
+    - explain: Compute Grad-CAM now (default) or skip it and return a prediction_id
+    - gradcam_format / gradcam_quality: Grad-CAM encoding
+    - multipart: Send Grad-CAM images as binary parts
+    - top_k: Return only the k most likely class ids instead of class names and disease info
     
     Returns:
     - prediction: Disease name
     - confidence: Prediction confidence (0-1)
     - all_predictions: All class probabilities
     - disease_info: Treatment and information
-    - gradcam: Grad-CAM visualization (base64)
+    - top_k / class_id / classes_etag: Instead of the above with top_k, ids into /classes/{crop_type}/metadata
+    - gradcam: Grad-CAM visualization (base64), null when explain=false
+    - prediction_id: Id for /predict/{prediction_id}/gradcam (explain=false only)
+    - cached: True when a repeat upload was answered from the result cache
+    - near_duplicate_distance: dHash bits from the earlier upload whose result was reused
     """
     crop = crop_type.value
-    
-    if crop not in models:
-        raise HTTPException(
-            status_code=503,
-            detail=f"{crop.title()} model not loaded. Please ensure the model is trained and available."
-        )
+    explain = options["explain"]
+    multipart = options["multipart"]
     
     # Validate file type
     if not file.content_type.startswith('image/'):
@@ -400,81 +1684,351 @@ async def predict_disease(
             detail="Invalid file type. Please upload an image."
         )
     
+    # Loads the model on first use; this version is held until the response is built
+    loaded = await acquire_crop_model(crop)
     try:
-        # Read image
-        image_bytes = await file.read()
+        # Re-uploads of the same photo (retries, shared images) skip inference
+        started = time.perf_counter()
+        upload, upload_hash = await read_upload(file, with_hash=result_cache is not None)
+        cache_key = result_cache_key(loaded, upload_hash, options) if upload_hash is not None else None
+        cached = await lookup_result(cache_key)
+        if cached is not None:
+            response = {
+                "success": True,
+                "crop_type": crop,
+                **cached["result"],
+                "gradcam": dict(cached["gradcam"]) if cached["gradcam"] else None,
+                "cached": True,
+                "timings_ms": {"cache_lookup": round((time.perf_counter() - started) * 1000, 3)}
+            }
+            if not explain:
+                # Kept as bytes: the upload's file is closed once this response is sent
+                prediction_id = await remember_for_explanation(
+                    loaded, cached["class_idx"], None, None, await file.read()
+                )
+                response["prediction_id"] = prediction_id
+                response["gradcam_url"] = f"/predict/{prediction_id}/gradcam"
+            return gradcam_response(response, multipart)
         
         print("🔄 Prediction in process...")
-        # Preprocess
-        img_array, original_image = preprocess_image(image_bytes)
+        # Preprocess (off the event loop)
+        timings = {}
+        use_index = near_duplicates is not None and not explain
+        if use_index:
+            img_array, original_image, phash = await executor.run(preprocess_image, upload, timings, True)
+            index_group = f"{crop}:{loaded['version']}"
+            match = near_duplicates.lookup(index_group, phash)
+            if match is not None:
+                # Re-shot or re-compressed copy of a recent confident prediction
+                predictions, distance = match
+                predicted_idx, result = describe_prediction(loaded, predictions, options["top_k"])
+                prediction_id = await remember_for_explanation(loaded, predicted_idx, original_image, None)
+                return JSONResponse({
+                    "success": True,
+                    "crop_type": crop,
+                    **result,
+                    "gradcam": None,
+                    "cached": True,
+                    "near_duplicate_distance": distance,
+                    "timings_ms": {stage: round(ms, 2) for stage, ms in timings.items()},
+                    "prediction_id": prediction_id,
+                    "gradcam_url": f"/predict/{prediction_id}/gradcam"
+                })
+        else:
+            img_array, original_image = await executor.run(preprocess_image, upload, timings)
         
-        # Predict using the correct model
-        model = models[crop]
-        predictions = model.predict(img_array, verbose=0)[0]
+        # Predict using the correct model (batched with concurrent requests).
+        # With a Grad-CAM engine the same pass also returns the heatmap
+        # (explain=true) or the conv activations kept to explain it later.
+        heatmap = prediction_id = None
+        if explain:
+            outputs = await submit_image(loaded, img_array[0], explain)
+            predictions, _, heatmap = outputs if isinstance(outputs, tuple) else (outputs, None, None)
+        else:
+            predictions, prediction_id = await submit_unexplained(loaded, img_array[0], original_image)
         
-        # Get top prediction
-        predicted_idx = int(np.argmax(predictions))
-        confidence = float(predictions[predicted_idx])
-        predicted_class = class_names[crop][predicted_idx]
+        # Get top prediction and disease information for this crop
+        predicted_idx, result = describe_prediction(loaded, predictions, options["top_k"])
+        if use_index and result["confidence"] >= NEAR_DUPLICATE_MIN_CONFIDENCE:
+            # Probabilities, so a later match can be described in either response mode
+            near_duplicates.add(index_group, phash, np.array(predictions))
         
-        # Generate Grad-CAM
         gradcam_data = None
-        heatmap = generate_gradcam(model, img_array, predicted_idx)
-        
-        if heatmap is not None:
-            overlay_base64 = create_gradcam_overlay(original_image, heatmap)
-            heatmap_base64 = create_heatmap_only(heatmap)
-            gradcam_data = {
-                "overlay": overlay_base64,
-                "heatmap": heatmap_base64
-            }
+        if explain:
+            # Generate Grad-CAM (legacy per-request path when no engine is available)
+            if heatmap is None and loaded["engine"] is None:
+                heatmap = await executor.run(generate_gradcam, loaded["model"], img_array / 255.0, predicted_idx)
+            gradcam_data = await executor.run(
+                build_gradcam_data, original_image, heatmap,
+                options["gradcam_format"], options["gradcam_quality"], multipart
+            )
         
-        # Get disease information for this crop
-        info = disease_info.get(crop, {}).get(predicted_class, {})
-        
-        # Build all predictions
-        all_preds = []
-        for idx, prob in enumerate(predictions):
-            all_preds.append({
-                "class": class_names[crop][idx],
-                "probability": float(prob)
+        if cache_key is not None:
+            # Copy: multipart responses move the image bytes out of the Grad-CAM dict
+            await store_result(cache_key, {
+                "result": result,
+                "class_idx": predicted_idx,
+                "gradcam": dict(gradcam_data) if gradcam_data else None
             })
-        all_preds.sort(key=lambda x: x['probability'], reverse=True)
         
-        return JSONResponse({
+        response = {
             "success": True,
             "crop_type": crop,
-            "prediction": predicted_class,
-            "confidence": confidence,
-            "si_name": info.get("si_name", predicted_class),
-            "description": info.get("description", ""),
-            "treatment": info.get("treatment", []),
-            "severity": info.get("severity", "unknown"),
-            "all_predictions": all_preds,
-            "gradcam": gradcam_data
-        })
+            **result,
+            "gradcam": gradcam_data,
+            "cached": False,
+            "timings_ms": {stage: round(ms, 2) for stage, ms in timings.items()}
+        }
+        if prediction_id is not None:
+            response["prediction_id"] = prediction_id
+            response["gradcam_url"] = f"/predict/{prediction_id}/gradcam"
         
+        return gradcam_response(response, multipart)
+        
+    except ExecutorSaturated as e:
+        raise saturated_response(e)
+    except (ImageRejected, InferenceServerError) as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Prediction failed: {str(e)}"
         )
+    finally:
+        release_crop_model(loaded)
+
+@app.post("/predict/batch")
+async def predict_batch(
+    files: List[UploadFile] = File(...),
+    crop_type: CropType = Query(default=CropType.rice, description="Type of crop (rice,tea or chili)"),
+    top_k: int = Query(default=0, ge=0, description="Return only the k most likely class ids per image; 0 = full results")
+):
+    """
+    Diagnose many leaf images in one request
+    
+    Images are decoded in parallel and go through the crop's micro-batcher, so
+    they share forward passes. Results stream back as NDJSON (one JSON object
+    per line, in completion order, each with its upload `index`), followed by a
+    final summary line. Grad-CAM for any image can be fetched afterwards from
+    its gradcam_url.
+    """
+    crop = crop_type.value
+    
+    if len(files) > BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many images ({len(files)}); the limit is {BATCH_MAX_IMAGES} per request."
+        )
+    # Load the model now so a missing model is a 503, not a broken stream
+    release_crop_model(await acquire_crop_model(crop))
+    
+    # Files stay open (spooled) until the response has been streamed
+    uploads = [(file.filename, file.content_type or "", file) for file in files]
+    # Leave executor room for other requests: decode at most one image per worker at a time
+    decode_slots = asyncio.Semaphore(executor.max_workers)
+    
+    def failure(entry, e):
+        if isinstance(e, ExecutorSaturated):
+            return {**entry, "success": False, "status_code": 503, "retry_after": e.retry_after,
+                    "error": "Service is busy processing other images. Please retry shortly."}
+        if isinstance(e, ImageRejected):
+            return {**entry, "success": False, "status_code": e.status_code, "error": str(e)}
+        return {**entry, "success": False, "status_code": 500, "error": f"Prediction failed: {str(e)}"}
+    
+    async def decode(index, filename, content_type, file):
+        entry = {"index": index, "filename": filename}
+        try:
+            if not content_type.startswith('image/'):
+                raise ImageRejected("Invalid file type. Please upload an image.")
+            upload, _ = await read_upload(file)
+            timings = {}
+            async with decode_slots:
+                img_array, original_image = await executor.run(preprocess_image, upload, timings)
+            return entry, (img_array, original_image, timings)
+        except Exception as e:
+            return failure(entry, e), None
+    
+    async def decode_chunk(chunk):
+        return await asyncio.gather(*[decode(index, *upload) for index, upload in chunk])
+    
+    async def classify(loaded, entry, decoded):
+        img_array, original_image, timings = decoded
+        try:
+            predictions, prediction_id = await submit_unexplained(loaded, img_array[0], original_image)
+            _, result = describe_prediction(loaded, predictions, top_k)
+            return {
+                **entry,
+                "success": True,
+                **result,
+                "prediction_id": prediction_id,
+                "gradcam_url": f"/predict/{prediction_id}/gradcam",
+                "timings_ms": {stage: round(ms, 2) for stage, ms in timings.items()}
+            }
+        except Exception as e:
+            return failure(entry, e)
+    
+    async def stream_results():
+        # Decode a batch-sized chunk, submit it all at once so it fills one forward
+        # pass, and decode the next chunk while that chunk is being classified
+        indexed = list(enumerate(uploads))
+        chunks = [indexed[i:i + BATCH_MAX_SIZE] for i in range(0, len(indexed), BATCH_MAX_SIZE)]
+        failed = 0
+        tasks = []
+        # The whole stream runs on the version current when it starts
+        loaded = await acquire_crop_model(crop)
+        next_chunk = asyncio.ensure_future(decode_chunk(chunks[0])) if chunks else None
+        try:
+            for i in range(len(chunks)):
+                decoded_chunk = await next_chunk
+                next_chunk = asyncio.ensure_future(decode_chunk(chunks[i + 1])) if i + 1 < len(chunks) else None
+                
+                tasks = []
+                for entry, decoded in decoded_chunk:
+                    if decoded is None:
+                        failed += 1
+                        yield json.dumps(entry, ensure_ascii=False) + "\n"
+                    else:
+                        tasks.append(asyncio.ensure_future(classify(loaded, entry, decoded)))
+                for next_done in asyncio.as_completed(tasks):
+                    result = await next_done
+                    failed += 0 if result["success"] else 1
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+            yield json.dumps({"done": True, "crop_type": crop, "count": len(uploads), "failed": failed}) + "\n"
+        finally:
+            # Client went away mid-stream: stop any remaining work
+            for task in tasks + ([next_chunk] if next_chunk is not None else []):
+                task.cancel()
+            release_crop_model(loaded)
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/predict/field")
+async def predict_field(
+    files: List[UploadFile] = File(...),
+    crop_type: CropType = Query(default=CropType.rice, description="Type of crop (rice,tea or chili)")
+):
+    """
+    Aggregated diagnosis for one plot from many leaf images
+    
+    All images are decoded in parallel and classified in a single batched
+    forward pass (no Grad-CAM, no per-image results). Returns class
+    prevalence, mean/max confidence and a field severity from disease_info.
+    """
+    crop = crop_type.value
+    
+    if len(files) > BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many images ({len(files)}); the limit is {BATCH_MAX_IMAGES} per request."
+        )
+    
+    uploads = [(file.filename, file.content_type or "", file) for file in files]
+    decode_slots = asyncio.Semaphore(executor.max_workers)
+    
+    async def decode(file, content_type):
+        if not content_type.startswith('image/'):
+            raise ImageRejected("Invalid file type. Please upload an image.")
+        upload, _ = await read_upload(file)
+        async with decode_slots:
+            img_array, _ = await executor.run(preprocess_image, upload)
+        return img_array
+    
+    decoded = await asyncio.gather(
+        *[decode(file, content_type) for _, content_type, file in uploads],
+        return_exceptions=True
+    )
+    
+    arrays = []
+    failed = []
+    for index, ((filename, _, _), result) in enumerate(zip(uploads, decoded)):
+        if isinstance(result, ExecutorSaturated):
+            raise saturated_response(result)
+        if isinstance(result, Exception):
+            failed.append({"index": index, "filename": filename, "error": str(result)})
+        else:
+            arrays.append(result)
+    
+    if not arrays:
+        raise HTTPException(status_code=400, detail={"error": "No readable images", "failed": failed})
+    
+    loaded = await acquire_crop_model(crop)
+    try:
+        probabilities = await run_predict_probabilities(loaded, np.concatenate(arrays))
+        field = aggregate_field_predictions(loaded, probabilities)
+    except ExecutorSaturated as e:
+        raise saturated_response(e)
+    except InferenceServerError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+    finally:
+        release_crop_model(loaded)
+    
+    return {
+        "success": True,
+        "crop_type": crop,
+        "images": len(uploads),
+        "analyzed": len(arrays),
+        "failed": failed,
+        "version": loaded["version"],
+        **field
+    }
+
+@app.get("/predict/{prediction_id}/gradcam")
+async def get_prediction_gradcam(
+    prediction_id: str,
+    gradcam_format: GradCAMFormat = Query(default=GradCAMFormat.png, description="png, jpeg, webp, or raw"),
+    gradcam_quality: int = Query(default=GRADCAM_QUALITY, ge=1, le=100, description="Quality for jpeg/webp"),
+    multipart: bool = Query(default=False, description="Return multipart/mixed with binary Grad-CAM parts")
+):
+    """
+    Grad-CAM for an earlier /predict call made with explain=false
+    
+    Records are kept for EXPLANATION_CACHE_TTL seconds.
+    """
+    try:
+        explained = await explanation_heatmap(prediction_id)
+        if explained is not None:
+            record, heatmap = explained
+            gradcam_data = await executor.run(
+                build_gradcam_data, record["image"], heatmap,
+                gradcam_format.value, gradcam_quality, multipart
+            )
+    except ExecutorSaturated as e:
+        raise saturated_response(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=getattr(e, "status_code", 500), detail=f"Grad-CAM failed: {str(e)}")
+    if explained is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Prediction not found or expired. Please predict again with explain=true."
+        )
+    
+    return gradcam_response({
+        "success": True,
+        "prediction_id": prediction_id,
+        "crop_type": record["crop_type"],
+        "prediction": record["prediction"],
+        "gradcam": gradcam_data
+    }, multipart)
 
 # Legacy endpoint for backward compatibility with rice predictions
 @app.post("/predict/rice")
-async def predict_rice_disease(file: UploadFile = File(...)):
+async def predict_rice_disease(file: UploadFile = File(...), options: dict = Depends(prediction_options)):
     """Legacy endpoint for rice disease prediction"""
-    return await predict_disease(file=file, crop_type=CropType.rice)
+    return await predict_disease(file=file, crop_type=CropType.rice, options=options)
 
 @app.post("/predict/tea")
-async def predict_tea_disease(file: UploadFile = File(...)):
+async def predict_tea_disease(file: UploadFile = File(...), options: dict = Depends(prediction_options)):
     """Endpoint for tea disease prediction"""
-    return await predict_disease(file=file, crop_type=CropType.tea)
+    return await predict_disease(file=file, crop_type=CropType.tea, options=options)
 
 @app.post("/predict/chili")
-async def predict_chili_disease(file: UploadFile = File(...)):
+async def predict_chili_disease(file: UploadFile = File(...), options: dict = Depends(prediction_options)):
     """Endpoint for chili disease prediction"""
-    return await predict_disease(file=file, crop_type=CropType.chili)
+    return await predict_disease(file=file, crop_type=CropType.chili, options=options)
 
 @app.get("/classes")
 async def get_all_classes():
@@ -514,6 +2068,31 @@ async def get_crop_classes(crop_type: CropType):
     
     return {"crop": crop, "classes": classes_with_info}
 
+@app.get("/classes/{crop_type}/metadata")
+async def get_crop_class_metadata(crop_type: CropType, if_none_match: str = Header(default="")):
+    """
+    Class table referenced by top-k predictions
+    
+    Precomputed from the crop's metadata at startup and replaced when a new
+    version is installed, so this never loads a model. In multi-worker mode
+    the inference server's current table is served. Send the ETag back in
+    If-None-Match to get a 304 while the classes are unchanged.
+    """
+    crop = crop_type.value
+    if inference_client is not None:
+        try:
+            table = await inference_client.call("class_table", crop_type=crop)
+        except InferenceServerError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+    else:
+        table = class_tables.get(crop)
+    if table is None:
+        raise HTTPException(status_code=404, detail=f"Class metadata for {crop} not found")
+    headers = {"ETag": table["etag"], "Cache-Control": "no-cache"}
+    if table["etag"] in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(table["body"], media_type="application/json", headers=headers)
+
 @app.get("/disease/{crop_type}/{disease_name}")
 async def get_disease_info_by_crop(crop_type: CropType, disease_name: str):
     """Get detailed information about a specific disease for a crop"""
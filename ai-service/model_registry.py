@@ -0,0 +1,186 @@
+"""
+Crop Model Registry
+Loads crop models on first use and evicts the least recently used ones when the
+resident set exceeds a memory budget
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ModelRegistry:
+    """
+    Resident-set manager for per-crop models
+
+    The registry does not hold the models itself; `load_fn(name)` loads one
+    (returning False on failure), `unload_fn(name)` drops it and `size_fn(name)`
+    estimates its resident bytes. Requests bracket their use of a model with
+    acquire()/release(); models in use and pinned models are never evicted.
+    A budget of 0 means unlimited.
+    """
+
+    def __init__(self, load_fn, unload_fn, size_fn, memory_budget_bytes=0, pinned=()):
+        self.load_fn = load_fn
+        self.unload_fn = unload_fn
+        self.size_fn = size_fn
+        self.memory_budget_bytes = max(0, int(memory_budget_bytes))
+        self.pinned = set(pinned)
+        self._resident = OrderedDict()  # name -> {"bytes", "in_use", "loaded_at", "load_seconds"}, LRU first
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.evictions = 0
+
+    def is_loaded(self, name):
+        return name in self._resident
+
+    @property
+    def resident_bytes(self):
+        return sum(entry["bytes"] for entry in self._resident.values())
+
+    def try_acquire(self, name):
+        """Mark a resident model as in use without loading; False if not resident"""
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry is None:
+                return False
+            entry["in_use"] += 1
+            self._resident.move_to_end(name)
+            self.hits += 1
+            return True
+
+    def acquire(self, name):
+        """
+        Mark a model as in use, loading it first if needed (blocking)
+
+        Returns False when the model cannot be loaded.
+        """
+        if self.try_acquire(name):
+            return True
+
+        # One load per model; concurrent first requests wait for the same load
+        with self._load_lock(name):
+            if self.try_acquire(name):
+                return True
+            with self._lock:
+                self.misses += 1
+
+            started = time.perf_counter()
+            try:
+                loaded = self.load_fn(name)
+            except Exception as e:
+                print(f"⚠️ Failed to load {name} model: {e}")
+                loaded = False
+            if not loaded:
+                with self._lock:
+                    self.load_failures += 1
+                # Drop anything a partial load left behind
+                self.unload_fn(name)
+                return False
+            load_seconds = time.perf_counter() - started
+
+            size = int(self.size_fn(name))
+            with self._lock:
+                self.loads += 1
+                self._resident[name] = {
+                    "bytes": size,
+                    "in_use": 1,
+                    "loaded_at": time.time(),
+                    "load_seconds": round(load_seconds, 3)
+                }
+        self._evict_over_budget()
+        return True
+
+    def release(self, name):
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry is not None and entry["in_use"] > 0:
+                entry["in_use"] -= 1
+        # Evictions deferred while everything was in use can happen now
+        self._evict_over_budget()
+
+    def resize(self, name, size):
+        """Record a resident model's new size (after a hot reload)"""
+        with self._lock:
+            if name in self._resident:
+                self._resident[name]["bytes"] = int(size)
+        self._evict_over_budget()
+
+    def preload(self, name):
+        """Load a model without keeping it marked as in use"""
+        loaded = self.acquire(name)
+        if loaded:
+            self.release(name)
+        return loaded
+
+    def expected_resident(self, names):
+        """
+        Those of `names` that should be in memory now: resident or pinned
+
+        Unpinned models evicted over the budget are left out; they load
+        again on their next acquire().
+        """
+        with self._lock:
+            return [name for name in names if name in self._resident or name in self.pinned]
+
+    def pin(self, name):
+        self.pinned.add(name)
+
+    def unpin(self, name):
+        self.pinned.discard(name)
+        self._evict_over_budget()
+
+    def _load_lock(self, name):
+        with self._lock:
+            return self._load_locks.setdefault(name, threading.Lock())
+
+    def _evict_over_budget(self):
+        if not self.memory_budget_bytes:
+            return
+        while True:
+            with self._lock:
+                if self.resident_bytes <= self.memory_budget_bytes:
+                    return
+                victim = next(
+                    (name for name, entry in self._resident.items()
+                     if entry["in_use"] == 0 and name not in self.pinned),
+                    None
+                )
+                if victim is None:
+                    # Everything left is pinned or serving a request
+                    return
+
+            # Hold the victim's load lock so a concurrent acquire() reloads it
+            # only after the unload has finished
+            with self._load_lock(victim):
+                with self._lock:
+                    entry = self._resident.get(victim)
+                    if entry is None or entry["in_use"] or victim in self.pinned:
+                        continue
+                    del self._resident[victim]
+                    self.evictions += 1
+                print(f"♻️ Evicting {victim} model (over {self.memory_budget_bytes // (1024 * 1024)} MB budget)")
+                self.unload_fn(victim)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": self.resident_bytes,
+                "pinned": sorted(self.pinned),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "loads": self.loads,
+                "load_failures": self.load_failures,
+                "evictions": self.evictions,
+                "resident": {
+                    name: {**entry, "pinned": name in self.pinned}
+                    for name, entry in self._resident.items()
+                }
+            }
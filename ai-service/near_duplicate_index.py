@@ -0,0 +1,81 @@
+"""
+Near-Duplicate Index
+Recent confident predictions looked up by perceptual hash, so a re-shot or
+re-compressed copy of a leaf photo can reuse the earlier result
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+class NearDuplicateIndex:
+    """
+    Ring buffer of (group, 64-bit perceptual hash, value) with TTL
+
+    Lookups scan the whole buffer with a vectorised XOR + popcount, which
+    for a few thousand entries takes microseconds. Entries only match
+    within their group (crop and model version), at a Hamming distance of
+    at most `max_distance` bits; the closest entry wins.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=600, max_distance=6):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_distance = int(max_distance)
+        self._hashes = np.zeros(self.max_entries, dtype=np.uint64)
+        self._groups = np.full(self.max_entries, -1, dtype=np.int32)
+        self._expires = np.zeros(self.max_entries, dtype=np.float64)
+        self._values = [None] * self.max_entries
+        self._group_ids = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.exact_hits = 0
+        self.inserts = 0
+
+    def add(self, group, phash, value):
+        with self._lock:
+            slot = self._next
+            self._next = (slot + 1) % self.max_entries
+            self._hashes[slot] = phash
+            self._groups[slot] = self._group_ids.setdefault(group, len(self._group_ids))
+            self._expires[slot] = time.monotonic() + self.ttl_seconds
+            self._values[slot] = value
+            self.inserts += 1
+
+    def lookup(self, group, phash):
+        """Closest live entry of the group as (value, distance), or None"""
+        with self._lock:
+            self.lookups += 1
+            group_id = self._group_ids.get(group)
+            if group_id is None:
+                return None
+            distances = np.bitwise_count(self._hashes ^ np.uint64(phash))
+            candidates = (self._groups == group_id) & (self._expires > time.monotonic()) & (distances <= self.max_distance)
+            if not candidates.any():
+                return None
+            slot = int(np.argmin(np.where(candidates, distances, 65)))
+            distance = int(distances[slot])
+            self.hits += 1
+            if distance == 0:
+                self.exact_hits += 1
+            return self._values[slot], distance
+
+    def __len__(self):
+        return int(np.count_nonzero(self._expires > time.monotonic()))
+
+    def stats(self):
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "max_distance": self.max_distance,
+            "inserts": self.inserts,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0
+        }
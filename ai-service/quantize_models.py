@@ -0,0 +1,224 @@
+"""
+Post-Training int8 Quantisation of the Crop Disease Models
+Calibrates on a sample of each crop's validation images, writes an int8 TFLite
+model next to the exported artifacts and reports test accuracy against float
+
+Usage:
+    python quantize_models.py                     # all crops
+    python quantize_models.py --crops tea --calibration-samples 300
+"""
+
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from sklearn.metrics import classification_report
+
+from export_models import MODEL_PATHS, export_saved_model
+from image_preprocessing import ImagePreprocessor
+from inference_backends import (
+    EXPORT_DIR, SERVING_SIGNATURE, export_paths, read_manifest, with_uint8_input,
+    KerasBackend, TFLiteBackend
+)
+
+DATASETS = {
+    "rice": {"path": "dataset", "class_indices_path": "models/class_indices.json"},
+    "tea": {"path": "tea_dataset", "class_indices_path": "models/tea/tea_class_indices.json"},
+    "chili": {"path": "chili_dataset", "class_indices_path": "models/chili/chili_class_indices.json"}
+}
+IMAGE_SIZE = (224, 224)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+EVAL_BATCH_SIZE = 32
+
+
+def load_class_names(path):
+    """Class index -> name, for both {"name": 0} and {"0": "name"} files"""
+    with open(path) as f:
+        indices = json.load(f)
+    if next(iter(indices)).isdigit():
+        return {int(k): v for k, v in indices.items()}
+    return {v: k for k, v in indices.items()}
+
+
+def normalise(name):
+    # Dataset folders use underscores (Blister_Blight) where class names use spaces
+    return name.replace("_", " ").strip().lower()
+
+
+def list_split(dataset_path, split, class_names):
+    """(image path, class index) pairs for one split; unknown folders are skipped"""
+    lookup = {normalise(name): idx for idx, name in class_names.items()}
+    split_dir = os.path.join(dataset_path, split)
+    samples = []
+    if not os.path.isdir(split_dir):
+        return samples
+    for folder in sorted(os.listdir(split_dir)):
+        idx = lookup.get(normalise(folder))
+        if idx is None:
+            print(f"⚠️ {split_dir}/{folder} does not match any class, skipping")
+            continue
+        folder_path = os.path.join(split_dir, folder)
+        for filename in sorted(os.listdir(folder_path)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(folder_path, filename), idx))
+    return samples
+
+
+def load_images(samples, preprocessor):
+    """Decode exactly as the service does (uint8, draft-mode JPEG resize)"""
+    images = []
+    labels = []
+    for path, idx in samples:
+        with open(path, "rb") as f:
+            try:
+                img_array, _ = preprocessor.preprocess(f.read())
+            except ValueError as e:
+                print(f"⚠️ Skipping {path}: {e}")
+                continue
+        images.append(img_array[0])
+        labels.append(idx)
+    return np.stack(images), np.array(labels)
+
+
+def calibration_sample(samples, count, seed=0):
+    """Random sample, stratified by class so rare diseases still calibrate the ranges"""
+    rng = np.random.default_rng(seed)
+    by_class = {}
+    for sample in samples:
+        by_class.setdefault(sample[1], []).append(sample)
+    per_class = max(1, count // max(1, len(by_class)))
+    chosen = []
+    for class_samples in by_class.values():
+        picks = rng.permutation(len(class_samples))[:per_class]
+        chosen.extend(class_samples[i] for i in picks)
+    return chosen
+
+
+def convert_int8(saved_model_path, calibration_images):
+    """
+    Full-integer post-training quantisation
+
+    Weights and activations are int8; the uint8 image input and float32
+    probabilities are unchanged, so the service feeds it like any other backend.
+    """
+    def representative_dataset():
+        for image in calibration_images:
+            yield [image[np.newaxis]]
+
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_path, signature_keys=[SERVING_SIGNATURE])
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def evaluate(backend, images, labels, class_names):
+    """classification_report dict, the same format as models/classification_report.json"""
+    predictions = np.concatenate([
+        backend.predict(images[i:i + EVAL_BATCH_SIZE])
+        for i in range(0, len(images), EVAL_BATCH_SIZE)
+    ])
+    return classification_report(
+        labels, np.argmax(predictions, axis=1),
+        labels=list(range(len(class_names))),
+        target_names=[class_names[i] for i in range(len(class_names))],
+        output_dict=True,
+        zero_division=0
+    )
+
+
+def quantize_crop(crop_type, calibration_samples=200, eval_split="test", export_dir=EXPORT_DIR):
+    """Calibrate, convert and evaluate one crop; returns the quantisation report"""
+    source_path = MODEL_PATHS[crop_type]
+    dataset = DATASETS[crop_type]
+    if not os.path.exists(source_path):
+        print(f"⚠️ {crop_type.title()} model not found at {source_path}, skipping")
+        return None
+
+    print(f"\n🔄 Quantising {crop_type} model from {source_path}...")
+    class_names = load_class_names(dataset["class_indices_path"])
+    preprocessor = ImagePreprocessor(IMAGE_SIZE)
+
+    valid_samples = list_split(dataset["path"], "valid", class_names)
+    eval_samples = list_split(dataset["path"], eval_split, class_names)
+    if not valid_samples or not eval_samples:
+        print(f"⚠️ {crop_type.title()} needs {dataset['path']}/valid and {dataset['path']}/{eval_split}, skipping")
+        return None
+
+    calibration_images, _ = load_images(calibration_sample(valid_samples, calibration_samples), preprocessor)
+    eval_images, eval_labels = load_images(eval_samples, preprocessor)
+    print(f"📊 Calibrating on {len(calibration_images)} validation images, evaluating on {len(eval_images)} {eval_split} images")
+
+    serving_model = with_uint8_input(keras.models.load_model(source_path))
+    paths = export_paths(crop_type, export_dir)
+    os.makedirs(paths["dir"], exist_ok=True)
+
+    saved_model_path = tempfile.mkdtemp(prefix=f"{crop_type}_savedmodel_")
+    try:
+        export_saved_model(serving_model, saved_model_path)
+        tflite_model = convert_int8(saved_model_path, calibration_images)
+    finally:
+        shutil.rmtree(saved_model_path, ignore_errors=True)
+    with open(paths["tflite_int8"], "wb") as f:
+        f.write(tflite_model)
+
+    float_report = evaluate(KerasBackend(serving_model), eval_images, eval_labels, class_names)
+    int8_report = evaluate(TFLiteBackend(paths["tflite_int8"], quantized=True), eval_images, eval_labels, class_names)
+    accuracy_delta = int8_report["accuracy"] - float_report["accuracy"]
+
+    report = {
+        "crop_type": crop_type,
+        "calibration_images": int(len(calibration_images)),
+        "eval_split": eval_split,
+        "eval_images": int(len(eval_images)),
+        "float_size_bytes": os.path.getsize(source_path),
+        "int8_size_bytes": os.path.getsize(paths["tflite_int8"]),
+        "accuracy_delta": accuracy_delta,
+        "float": float_report,
+        "int8": int8_report
+    }
+    with open(os.path.join(paths["dir"], "quantization_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    # Record the result where the service reads it (its accuracy gate)
+    manifest = read_manifest(paths["manifest"])
+    manifest.setdefault("crop_type", crop_type)
+    manifest.setdefault("artifacts", {})["tflite_int8"] = {
+        "path": os.path.relpath(paths["tflite_int8"], paths["dir"]),
+        "accuracy_float": float_report["accuracy"],
+        "accuracy_int8": int8_report["accuracy"],
+        "accuracy_delta": accuracy_delta
+    }
+    with open(paths["manifest"], "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"✅ int8 model: {paths['tflite_int8']} "
+          f"({report['int8_size_bytes'] / 1e6:.1f} MB vs {report['float_size_bytes'] / 1e6:.1f} MB float)")
+    print(f"📈 Accuracy: float {float_report['accuracy']:.4f} -> int8 {int8_report['accuracy']:.4f} "
+          f"(delta {accuracy_delta:+.4f})")
+    for name in class_names.values():
+        print(f"   {name:<28} f1 {float_report[name]['f1-score']:.3f} -> {int8_report[name]['f1-score']:.3f}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-training int8 quantisation of the crop disease models")
+    parser.add_argument("--crops", nargs="+", default=list(MODEL_PATHS), choices=list(MODEL_PATHS))
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--eval-split", default="test", choices=["valid", "test"])
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🗜️ Quantising Crop Disease Models (int8)")
+    print("=" * 60)
+    for crop_type in args.crops:
+        quantize_crop(crop_type, args.calibration_samples, args.eval_split, args.export_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Prediction Result Cache
+Repeat uploads of the same photo are answered from a cache keyed by content
+hash: an in-process TTLCache, optionally backed by a SQLite file shared by
+every worker process on the host
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Expired and least recently used rows are trimmed once every this many writes
+TRIM_EVERY = 64
+# JSON has no bytes type: binary values (multipart Grad-CAM images) are stored as {BYTES_KEY: base64}
+BYTES_KEY = "__bytes__"
+
+
+def content_hasher():
+    """Incremental form of content_hash: update() with chunks, then hexdigest()"""
+    return hashlib.blake2b(digest_size=16)
+
+
+def content_hash(data):
+    """Short, collision-resistant id for uploaded bytes"""
+    hasher = content_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def _encode_bytes(value):
+    if isinstance(value, bytes):
+        return {BYTES_KEY: base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode_bytes(obj):
+    if len(obj) == 1 and BYTES_KEY in obj:
+        return base64.b64decode(obj[BYTES_KEY])
+    return obj
+
+
+def dump_value(value):
+    """JSON text of a cached value; unlike pickle, loading it back cannot run code"""
+    return json.dumps(value, default=_encode_bytes, separators=(",", ":"))
+
+
+def load_value(text):
+    return json.loads(text, object_hook=_decode_bytes)
+
+
+class SQLiteCache:
+    """
+    TTL + LRU cache in a SQLite file (values are stored as JSON, see dump_value)
+
+    Safe to share between processes: WAL mode lets readers run alongside a
+    writer. Errors (e.g. a locked database) count as misses rather than
+    failing the request. Hit/miss counters are per process.
+    """
+
+    def __init__(self, path, max_entries=10000, ttl_seconds=3600):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.errors = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+
+    def _connection(self):
+        # sqlite3 connections are not shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key, default=None):
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return default
+            value, expires_at = row
+            if expires_at < now:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._count("expirations")
+                self._count("misses")
+                return default
+            conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            value = load_value(value)
+        except sqlite3.Error as e:
+            print(f"⚠️ Result cache read failed: {e}")
+            self._count("errors")
+            self._count("misses")
+            return default
+        except ValueError as e:
+            # Unreadable row (e.g. written by an older version): drop it
+            print(f"⚠️ Result cache entry unreadable: {e}")
+            self._delete(key)
+            self._count("errors")
+            self._count("misses")
+            return default
+        self._count("hits")
+        return value
+
+    def set(self, key, value):
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, dump_value(value), now + self.ttl_seconds, now)
+            )
+            with self._lock:
+                self._writes += 1
+                trim = self._writes % TRIM_EVERY == 0
+            if trim:
+                self.trim()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"⚠️ Result cache write failed: {e}")
+            self._count("errors")
+
+    def _delete(self, key):
+        try:
+            self._connection().execute("DELETE FROM results WHERE key = ?", (key,))
+        except sqlite3.Error:
+            pass
+
+    def trim(self):
+        """Drop expired rows, then the least recently used ones over max_entries"""
+        conn = self._connection()
+        conn.execute("DELETE FROM results WHERE expires_at < ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM results WHERE key IN ("
+            "SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def __len__(self):
+        try:
+            return self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expirations": self.expirations,
+            "errors": self.errors
+        }
+
+
+class ResultCache:
+    """In-process cache in front of an optional shared disk cache"""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                # Another worker computed it; keep a local copy
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
@@ -0,0 +1,88 @@
+"""
+Runtime Configuration
+TensorFlow thread pools, oneDNN and CPU affinity of a serving process, read
+from environment variables (benchmark_runtime.py sweeps the same variables)
+
+apply_process_settings() must run before TensorFlow is imported: oneDNN
+options are read when TF loads. configure_tensorflow() runs after the import
+and before the first op, as TF fixes its thread pools then.
+"""
+
+import os
+
+
+def parse_cpu_list(value):
+    """'0-3,8' -> [0, 1, 2, 3, 8]; empty -> []"""
+    cpus = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def runtime_settings(environ=os.environ):
+    """
+    Settings for this process
+
+    Multi-worker HTTP workers (INFERENCE_SERVER_SOCKET set) are pinned with
+    WORKER_CPU_AFFINITY; the inference server and single-process mode with
+    CPU_AFFINITY. Thread counts of 0 leave TensorFlow's default, except that
+    a pinned process defaults to one intra-op thread per pinned CPU.
+    """
+    worker = bool(environ.get("INFERENCE_SERVER_SOCKET"))
+    onednn = environ.get("TF_ENABLE_ONEDNN_OPTS", "").strip()
+    return {
+        "role": "worker" if worker else "server",
+        "cpus": parse_cpu_list(environ.get("WORKER_CPU_AFFINITY" if worker else "CPU_AFFINITY", "")),
+        "intra_op_threads": int(environ.get("TF_INTRA_OP_THREADS", "0")),
+        "inter_op_threads": int(environ.get("TF_INTER_OP_THREADS", "0")),
+        "onednn": None if not onednn else onednn.lower() in ("1", "true", "yes"),
+        "backend_threads": max(1, int(environ.get("BACKEND_THREADS", "1")))
+    }
+
+
+def apply_process_settings(settings):
+    """CPU affinity and oneDNN switch; call before importing TensorFlow"""
+    if settings["cpus"]:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, settings["cpus"])
+            print(f"📌 Pinned {settings['role']} process {os.getpid()} to CPUs {settings['cpus']}")
+        else:
+            print("⚠️ CPU affinity is not supported on this platform, ignoring it")
+    if settings["onednn"] is not None:
+        os.environ["TF_ENABLE_ONEDNN_OPTS"] = "1" if settings["onednn"] else "0"
+
+
+def configure_tensorflow(settings):
+    """Intra/inter-op thread pools; call after importing TensorFlow, before running any op"""
+    import tensorflow as tf
+
+    intra = settings["intra_op_threads"] or len(settings["cpus"])
+    try:
+        if intra:
+            tf.config.threading.set_intra_op_parallelism_threads(intra)
+        if settings["inter_op_threads"]:
+            tf.config.threading.set_inter_op_parallelism_threads(settings["inter_op_threads"])
+    except RuntimeError as e:
+        # TensorFlow already ran an op in this process
+        print(f"⚠️ TensorFlow thread settings not applied: {e}")
+
+
+def runtime_report(settings):
+    """Effective settings, for /metrics"""
+    import tensorflow as tf
+
+    return {
+        **settings,
+        "intra_op_threads": tf.config.threading.get_intra_op_parallelism_threads(),
+        "inter_op_threads": tf.config.threading.get_inter_op_parallelism_threads(),
+        "onednn": os.environ.get("TF_ENABLE_ONEDNN_OPTS") or "default",
+        "affinity": sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None,
+        "cpu_count": os.cpu_count()
+    }
@@ -0,0 +1,135 @@
+"""
+Shared-Backbone Multi-Crop Model
+One MobileNetV2 feature extractor feeds a small classification head per crop
+(trained by train_multicrop_model.py), so a single backbone pass serves any
+crop and mixed-crop batches share it
+"""
+
+import os
+import threading
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+MULTICROP_DIR = os.path.join("models", "multicrop")
+BACKBONE_FILE = "backbone.keras"
+
+
+def multicrop_paths(crop_type, model_dir=MULTICROP_DIR):
+    """Backbone, head and class index files written by train_multicrop_model.py"""
+    return {
+        "backbone": os.path.join(model_dir, BACKBONE_FILE),
+        "head": os.path.join(model_dir, f"{crop_type}_head.keras"),
+        "class_indices": os.path.join(model_dir, f"{crop_type}_class_indices.json")
+    }
+
+
+def weights_bytes(model):
+    return sum(int(np.prod(w.shape)) * np.dtype(w.dtype).itemsize for w in model.weights)
+
+
+class CropHeadBackend:
+    """One crop head of the shared model behind the inference backend predict() interface"""
+
+    name = "shared"
+    quantized = False
+
+    def __init__(self, shared, head_key):
+        self.shared = shared
+        self.head_key = head_key
+
+    def predict(self, img_batch):
+        return self.shared.predict(img_batch, self.head_key)
+
+
+class SharedBackbone:
+    """
+    Shared feature extractor plus the per-crop heads currently loaded
+
+    Inputs are uint8 images; the 1/255 rescaling used in training runs inside
+    the traced backbone function. Heads are loaded and dropped independently
+    under a key (the crop name by default; several versions of one crop's head
+    can be loaded under different keys), the backbone stays resident.
+    """
+
+    def __init__(self, model_dir=MULTICROP_DIR):
+        self.model_dir = model_dir
+        self.backbone = keras.models.load_model(os.path.join(model_dir, BACKBONE_FILE))
+        self.input_shape = tuple(self.backbone.input_shape[1:])
+        self.feature_shape = tuple(self.backbone.output_shape[1:])
+        self.heads = {}
+        self._head_fns = {}
+        self._lock = threading.Lock()
+
+        image_spec = tf.TensorSpec(shape=(None, *self.input_shape), dtype=tf.uint8)
+        self._features = tf.function(self._features_batch, input_signature=[image_spec])
+
+    def _features_batch(self, images):
+        # Same arithmetic as a Rescaling(1/255) layer, so activations match Grad-CAM's
+        return self.backbone(tf.cast(images, tf.float32) * (1.0 / 255), training=False)
+
+    @property
+    def backbone_bytes(self):
+        return weights_bytes(self.backbone)
+
+    def head_bytes(self, head_key):
+        return weights_bytes(self.heads[head_key])
+
+    def load_head(self, crop_type, head_key=None):
+        """Load (or return the already loaded) classification head of a crop"""
+        head_key = head_key or crop_type
+        with self._lock:
+            if head_key in self.heads:
+                return self.heads[head_key]
+        head = keras.models.load_model(multicrop_paths(crop_type, self.model_dir)["head"])
+        if tuple(head.input_shape[1:]) != self.feature_shape:
+            raise ValueError(
+                f"{crop_type} head expects {head.input_shape[1:]} features, backbone gives {self.feature_shape}"
+            )
+        feature_spec = tf.TensorSpec(shape=(None, *self.feature_shape), dtype=tf.float32)
+        head_fn = tf.function(lambda features: head(features, training=False), input_signature=[feature_spec])
+        with self._lock:
+            self.heads.setdefault(head_key, head)
+            self._head_fns.setdefault(head_key, head_fn)
+            return self.heads[head_key]
+
+    def unload_head(self, head_key):
+        with self._lock:
+            self.heads.pop(head_key, None)
+            self._head_fns.pop(head_key, None)
+
+    def crop_model(self, crop_type, head_key=None):
+        """
+        Full float-input classifier for one crop (Input -> backbone -> head)
+
+        Layers are reused, so weights are shared with every other crop; used
+        for Grad-CAM, which needs the backbone and head in one graph.
+        """
+        head = self.load_head(crop_type, head_key)
+        inputs = keras.Input(shape=self.input_shape)
+        outputs = head(self.backbone(inputs, training=False), training=False)
+        return keras.Model(inputs, outputs, name=f"{crop_type}_multicrop")
+
+    def predict(self, img_batch, head_key):
+        """Class probabilities of one crop head for a uint8 batch"""
+        features = self._features(tf.convert_to_tensor(img_batch, dtype=tf.uint8))
+        return self._head_fns[head_key](features).numpy()
+
+    def predict_mixed(self, img_batch, head_keys):
+        """
+        One backbone pass over images of any crops, then each head on its own rows
+
+        Returns one (probabilities, backbone activations) pair per image, in
+        batch order; the activations let a later Grad-CAM skip the backbone.
+        """
+        features = self._features(tf.convert_to_tensor(img_batch, dtype=tf.uint8))
+        feature_rows = features.numpy()
+        head_keys = np.asarray(head_keys)
+        outputs = [None] * len(head_keys)
+        for head_key in np.unique(head_keys):
+            rows = np.flatnonzero(head_keys == head_key)
+            probabilities = self._head_fns[str(head_key)](tf.gather(features, rows)).numpy()
+            for probs, row in zip(probabilities, rows):
+                outputs[row] = (probs, feature_rows[row])
+        return outputs
@@ -0,0 +1,14 @@
+#!/bin/sh
+# Start the AI service. With WEB_CONCURRENCY > 1 one inference server process
+# holds the crop models and WEB_CONCURRENCY uvicorn workers serve HTTP,
+# sending forward passes to it over a Unix socket.
+set -e
+
+WORKERS="${WEB_CONCURRENCY:-1}"
+if [ "$WORKERS" -le 1 ]; then
+    exec uvicorn main:app --host 0.0.0.0 --port 8000
+fi
+
+export INFERENCE_SERVER_SOCKET="${INFERENCE_SERVER_SOCKET:-/tmp/govi-inference.sock}"
+python inference_server.py --socket "$INFERENCE_SERVER_SOCKET" &
+exec uvicorn main:app --host 0.0.0.0 --port 8000 --workers "$WORKERS"
@@ -0,0 +1,137 @@
+"""MicroBatcher behaviour with a plain function in place of a model"""
+
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from inference_batcher import MicroBatcher
+
+
+class RecordingModel:
+    """Doubles its inputs and records the size of every batch it gets"""
+
+    def __init__(self, fail=False):
+        self.batch_sizes = []
+        self.fail = fail
+
+    def __call__(self, batch):
+        self.batch_sizes.append(len(batch))
+        if self.fail:
+            raise ValueError("model failed")
+        return batch * 2
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = RecordingModel()
+
+    async def scenario():
+        batcher = MicroBatcher("test", model, max_batch_size=4, max_wait_ms=50)
+        try:
+            return await asyncio.gather(*[batcher.submit(np.array([i])) for i in range(10)])
+        finally:
+            await batcher.stop()
+
+    results = run(scenario())
+    assert [int(result[0]) for result in results] == [i * 2 for i in range(10)]
+    assert model.batch_sizes == [4, 4, 2]
+
+
+def test_full_batch_does_not_wait_for_the_window():
+    model = RecordingModel()
+
+    async def scenario():
+        batcher = MicroBatcher("test", model, max_batch_size=4, max_wait_ms=5000)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*[batcher.submit(np.array([i])) for i in range(4)])
+            return time.perf_counter() - started
+        finally:
+            await batcher.stop()
+
+    assert run(scenario()) < 1.0
+    assert model.batch_sizes == [4]
+
+
+def test_partial_batch_flushes_when_the_window_closes():
+    model = RecordingModel()
+
+    async def scenario():
+        batcher = MicroBatcher("test", model, max_batch_size=16, max_wait_ms=50)
+        try:
+            started = time.perf_counter()
+            result = await batcher.submit(np.array([3]))
+            return result, time.perf_counter() - started
+        finally:
+            await batcher.stop()
+
+    result, elapsed = run(scenario())
+    assert int(result[0]) == 6
+    assert 0.04 <= elapsed < 1.0
+    assert model.batch_sizes == [1]
+
+
+def test_tuple_outputs_are_split_per_request():
+    async def scenario():
+        batcher = MicroBatcher("test", lambda batch: (batch + 1, batch.sum(axis=1)), max_batch_size=2)
+        try:
+            return await asyncio.gather(batcher.submit(np.array([1, 2])), batcher.submit(np.array([3, 4])))
+        finally:
+            await batcher.stop()
+
+    (first_plus, first_sum), (second_plus, second_sum) = run(scenario())
+    assert first_plus.tolist() == [2, 3] and first_sum == 3
+    assert second_plus.tolist() == [4, 5] and second_sum == 7
+
+
+def test_model_error_reaches_every_waiter_and_batcher_keeps_serving():
+    model = RecordingModel(fail=True)
+
+    async def scenario():
+        batcher = MicroBatcher("test", model, max_batch_size=3, max_wait_ms=20)
+        try:
+            failed = await asyncio.gather(*[batcher.submit(np.array([i])) for i in range(3)], return_exceptions=True)
+            model.fail = False
+            recovered = await batcher.submit(np.array([5]))
+            return failed, recovered, batcher.metrics.errors
+        finally:
+            await batcher.stop()
+
+    failed, recovered, errors = run(scenario())
+    assert all(isinstance(e, ValueError) for e in failed)
+    assert int(recovered[0]) == 10
+    assert errors == 1
+
+
+def test_stop_fails_requests_still_queued():
+    async def scenario():
+        batcher = MicroBatcher("test", lambda batch: time.sleep(0.2) or batch, max_batch_size=1, max_wait_ms=0)
+        # The first request occupies the model; the second is still queued at stop()
+        asyncio.ensure_future(batcher.submit(np.array([1])))
+        queued = asyncio.ensure_future(batcher.submit(np.array([2])))
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        return queued
+
+    queued = run(scenario())
+    with pytest.raises(RuntimeError, match="batcher stopped"):
+        queued.result()
+
+
+def test_stop_fails_the_batch_being_run():
+    async def scenario():
+        batcher = MicroBatcher("test", lambda batch: time.sleep(0.2) or batch, max_batch_size=2, max_wait_ms=0)
+        running = asyncio.ensure_future(batcher.submit(np.array([1])))
+        await asyncio.sleep(0.05)
+        # The model is still busy with this request's batch when the batcher stops
+        await batcher.stop()
+        return running
+
+    running = run(scenario())
+    with pytest.raises(RuntimeError, match="batcher stopped"):
+        running.result()
@@ -0,0 +1,125 @@
+"""ModelRegistry behaviour with plain callables in place of model loading"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from model_registry import ModelRegistry
+
+
+class FakeModels:
+    """load/unload/size callables that record what the registry asked for"""
+
+    def __init__(self, size=60, load_seconds=0.0, fail=()):
+        self.size = size
+        self.load_seconds = load_seconds
+        self.fail = set(fail)
+        self.loaded = set()
+        self.loads = []
+        self.unloads = []
+        self._lock = threading.Lock()
+
+    def load(self, name):
+        with self._lock:
+            self.loads.append(name)
+        time.sleep(self.load_seconds)
+        if name in self.fail:
+            return False
+        self.loaded.add(name)
+        return True
+
+    def unload(self, name):
+        self.unloads.append(name)
+        self.loaded.discard(name)
+
+    def size_of(self, name):
+        return self.size
+
+    def registry(self, budget=0, pinned=()):
+        return ModelRegistry(self.load, self.unload, self.size_of, memory_budget_bytes=budget, pinned=pinned)
+
+
+def test_concurrent_acquires_load_once():
+    models = FakeModels(load_seconds=0.1)
+    registry = models.registry()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: registry.acquire("rice"), range(8)))
+
+    assert results == [True] * 8
+    assert models.loads == ["rice"]
+    assert registry.stats()["resident"]["rice"]["in_use"] == 8
+
+
+def test_pinned_model_is_never_evicted():
+    models = FakeModels(size=60)
+    registry = models.registry(budget=100, pinned={"rice"})
+
+    assert registry.preload("rice")
+    assert registry.preload("tea")
+
+    assert registry.is_loaded("rice")
+    assert not registry.is_loaded("tea")
+    assert models.unloads == ["tea"]
+
+
+def test_model_in_use_is_not_evicted_until_released():
+    models = FakeModels(size=60)
+    registry = models.registry(budget=100)
+
+    assert registry.acquire("rice")
+    assert registry.acquire("tea")
+    # Over budget, but both are serving requests
+    assert registry.is_loaded("rice") and registry.is_loaded("tea")
+    assert models.unloads == []
+
+    registry.release("tea")
+    # rice is least recently used but still in use, so tea goes
+    assert registry.is_loaded("rice")
+    assert not registry.is_loaded("tea")
+
+    registry.release("rice")
+    assert registry.acquire("chili")
+    registry.release("chili")
+    assert not registry.is_loaded("rice")
+    assert models.unloads == ["tea", "rice"]
+
+
+def test_least_recently_used_model_is_evicted_first():
+    models = FakeModels(size=40)
+    registry = models.registry(budget=100)
+
+    registry.preload("rice")
+    registry.preload("tea")
+    # Using rice makes tea the least recently used
+    assert registry.try_acquire("rice")
+    registry.release("rice")
+    registry.preload("chili")
+
+    assert models.unloads == ["tea"]
+    assert registry.is_loaded("rice") and registry.is_loaded("chili")
+
+
+def test_failed_load_is_reported_and_cleaned_up():
+    models = FakeModels(fail={"tea"})
+    registry = models.registry()
+
+    assert not registry.acquire("tea")
+    assert not registry.is_loaded("tea")
+    assert models.unloads == ["tea"]
+    assert registry.stats()["load_failures"] == 1
+
+
+def test_evicted_model_is_not_expected_resident():
+    models = FakeModels(size=60)
+    registry = models.registry(budget=100, pinned={"chili"})
+
+    registry.preload("rice")
+    registry.preload("tea")
+
+    # Readiness waits only for resident or pinned models, not evicted ones
+    assert models.unloads == ["rice"]
+    assert registry.expected_resident(["rice", "tea", "chili"]) == ["tea", "chili"]
+
+    registry.preload("rice")
+    assert registry.expected_resident(["rice", "tea", "chili"]) == ["rice", "chili"]
@@ -0,0 +1,83 @@
+"""SQLiteCache and ResultCache: JSON storage, TTL expiry and trimming, with a fake clock"""
+
+import sqlite3
+
+import pytest
+
+import result_cache
+import ttl_cache
+from result_cache import ResultCache, SQLiteCache
+from ttl_cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_values_round_trip_as_json_with_bytes(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / "results.db"))
+    value = {"result": {"prediction": "Brown Spot", "confidence": 0.9}, "class_idx": 2,
+             "gradcam": {"format": "png", "overlay": b"\x89PNG\x00\xff"}}
+    cache.set("key", value)
+
+    assert cache.get("key") == value
+    raw = sqlite3.connect(cache.path).execute("SELECT value FROM results").fetchone()[0]
+    assert isinstance(raw, str) and "Brown Spot" in raw
+
+
+def test_unreadable_row_is_a_miss_and_is_dropped(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / "results.db"))
+    cache.set("key", {"result": 1})
+    # e.g. a pickled row written by an older version
+    cache._connection().execute("UPDATE results SET value = ?", (sqlite3.Binary(b"\x80\x05K\x01."),))
+
+    assert cache.get("key") is None
+    assert len(cache) == 0
+    assert cache.stats()["errors"] == 1
+
+
+def test_sqlite_entries_expire_after_ttl(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / "results.db"), ttl_seconds=10)
+    cache.set("key", {"result": 1})
+
+    clock[0] += 11
+    assert cache.get("key") is None
+    assert len(cache) == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_trim_drops_expired_then_least_recently_used_rows(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / "results.db"), max_entries=2, ttl_seconds=10)
+    cache.set("old", 0)
+    clock[0] += 10
+    for key in ("rice", "tea", "chili"):
+        clock[0] += 1
+        cache.set(key, key)
+    # Reading rice makes tea the least recently used
+    clock[0] += 1
+    assert cache.get("rice") == "rice"
+
+    cache.trim()
+    rows = cache._connection().execute("SELECT key FROM results ORDER BY key").fetchall()
+    assert [key for key, in rows] == ["chili", "rice"]
+
+
+def test_result_cache_fills_memory_from_disk(tmp_path, clock):
+    disk = SQLiteCache(str(tmp_path / "results.db"), ttl_seconds=60)
+    # Another worker computed the result
+    ResultCache(TTLCache(ttl_seconds=10), disk).set("key", {"result": 1})
+    cache = ResultCache(TTLCache(ttl_seconds=10), disk)
+
+    assert cache.get("key") == {"result": 1}
+    assert cache.memory.get("key") == {"result": 1}
+
+    # The memory copy expires first; the disk tier still answers until its own TTL
+    clock[0] += 11
+    assert cache.memory.get("key") is None
+    assert cache.get("key") == {"result": 1}
+    clock[0] += 60
+    assert cache.get("key") is None
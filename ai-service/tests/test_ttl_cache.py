@@ -0,0 +1,38 @@
+"""TTLCache expiry and LRU trimming, with a fake clock"""
+
+import pytest
+
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(max_entries=4, ttl_seconds=10)
+    cache.set("rice", 1)
+
+    clock[0] += 9
+    assert cache.get("rice") == 1
+    clock[0] += 2
+    assert cache.get("rice") is None
+    assert len(cache) == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_trimmed(clock):
+    cache = TTLCache(max_entries=2, ttl_seconds=10)
+    cache.set("rice", 1)
+    cache.set("tea", 2)
+    # Reading rice makes tea the least recently used
+    assert cache.get("rice") == 1
+    cache.set("chili", 3)
+
+    assert cache.get("tea") is None
+    assert cache.get("rice") == 1 and cache.get("chili") == 3
+    assert cache.stats()["evictions"] == 1
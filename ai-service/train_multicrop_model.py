@@ -0,0 +1,284 @@
+"""
+Shared-Backbone Multi-Crop Disease Model Training
+One MobileNetV2 backbone with a classification head per crop (rice, tea, chili),
+served by main.py with SHARED_BACKBONE=true
+
+Phase 1 trains each crop's head on the frozen ImageNet backbone. The optional
+phase 2 (--fine-tune) unfreezes the top of the backbone and trains it jointly
+on all crops, one batch of each crop per step, so it stays shared.
+
+Usage:
+    python train_multicrop_model.py                 # frozen backbone
+    python train_multicrop_model.py --fine-tune     # plus joint fine-tuning
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+from tensorflow.keras.applications import MobileNetV2
+from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+
+from shared_backbone import MULTICROP_DIR, multicrop_paths
+
+# Configuration
+CONFIG = {
+    "image_size": (224, 224),
+    "batch_size": 16,
+    "epochs": 60,
+    "learning_rate": 0.0005,
+    "fine_tune_epochs": 20,
+    "fine_tune_lr": 0.00005,
+    "fine_tune_layers": 50,
+    "datasets": {
+        "rice": "dataset",
+        "tea": "tea_dataset",
+        "chili": "chili_dataset"
+    },
+    "model_save_path": MULTICROP_DIR
+}
+
+
+def create_data_generators(dataset_path, config):
+    """Train/valid/test generators, with the same augmentation as the per-crop scripts"""
+    train_datagen = ImageDataGenerator(
+        rescale=1./255,
+        rotation_range=40,
+        width_shift_range=0.3,
+        height_shift_range=0.3,
+        shear_range=0.3,
+        zoom_range=0.3,
+        horizontal_flip=True,
+        vertical_flip=True,
+        fill_mode='reflect',
+        brightness_range=[0.6, 1.4],
+        channel_shift_range=30
+    )
+    val_datagen = ImageDataGenerator(rescale=1./255)
+
+    train_generator = train_datagen.flow_from_directory(
+        os.path.join(dataset_path, "train"),
+        target_size=config["image_size"],
+        batch_size=config["batch_size"],
+        class_mode='categorical',
+        shuffle=True
+    )
+    # Valid/test use the train class order, even when a split lacks some classes
+    eval_generators = [
+        val_datagen.flow_from_directory(
+            os.path.join(dataset_path, split),
+            target_size=config["image_size"],
+            batch_size=config["batch_size"],
+            class_mode='categorical',
+            classes=list(train_generator.class_indices),
+            shuffle=False
+        )
+        for split in ("valid", "test")
+    ]
+    return [train_generator, *eval_generators]
+
+
+def create_backbone(config):
+    """Shared ImageNet MobileNetV2 feature extractor (frozen initially)"""
+    backbone = MobileNetV2(
+        input_shape=(*config["image_size"], 3),
+        include_top=False,
+        weights='imagenet'
+    )
+    backbone.trainable = False
+    return backbone
+
+
+def create_head(crop_type, num_classes, feature_shape):
+    """Per-crop classification head, the same layers as create_model's head"""
+    inputs = keras.Input(shape=feature_shape)
+    x = layers.GlobalAveragePooling2D()(inputs)
+    x = layers.BatchNormalization()(x)
+    x = layers.Dropout(0.5)(x)
+    x = layers.Dense(256, activation='relu', kernel_regularizer=keras.regularizers.l2(0.01))(x)
+    x = layers.BatchNormalization()(x)
+    x = layers.Dropout(0.4)(x)
+    x = layers.Dense(128, activation='relu', kernel_regularizer=keras.regularizers.l2(0.01))(x)
+    x = layers.Dropout(0.3)(x)
+    outputs = layers.Dense(num_classes, activation='softmax')(x)
+    return keras.Model(inputs, outputs, name=f"{crop_type}_head")
+
+
+def create_crop_model(crop_type, backbone, head, config):
+    """Augmentation -> shared backbone -> crop head, for training one crop"""
+    inputs = keras.Input(shape=(*config["image_size"], 3))
+    x = layers.RandomFlip("horizontal")(inputs)
+    x = layers.RandomRotation(0.2)(x)
+    x = layers.RandomZoom(0.2)(x)
+    # BatchNorm statistics stay frozen, also while fine-tuning
+    x = backbone(x, training=False)
+    outputs = head(x)
+    return keras.Model(inputs, outputs, name=f"{crop_type}_multicrop")
+
+
+def train_heads(crop_models, generators, config):
+    """Phase 1: each head on the frozen backbone (independent, as the backbone does not change)"""
+    for crop_type, model in crop_models.items():
+        train_gen, val_gen, _ = generators[crop_type]
+        print(f"\n📚 Training {crop_type} head")
+        model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=config["learning_rate"]),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        model.fit(
+            train_gen,
+            validation_data=val_gen,
+            epochs=config["epochs"],
+            callbacks=[
+                EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True, verbose=1),
+                ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5, min_lr=1e-7, verbose=1)
+            ],
+            verbose=1
+        )
+
+
+def validation_accuracy(crop_models, generators):
+    accuracies = {}
+    for crop_type, model in crop_models.items():
+        _, val_gen, _ = generators[crop_type]
+        val_gen.reset()
+        predictions = model.predict(val_gen, verbose=0)
+        accuracies[crop_type] = float(np.mean(np.argmax(predictions, axis=1) == val_gen.classes))
+    return accuracies
+
+
+def fine_tune_jointly(backbone, heads, crop_models, generators, config):
+    """
+    Phase 2: unfreeze the top backbone layers and train them on every crop
+
+    Each step sums one batch's loss per crop, so a single update moves the
+    shared backbone for all heads. Weights with the best mean validation
+    accuracy are kept.
+    """
+    backbone.trainable = True
+    for layer in backbone.layers[:-config["fine_tune_layers"]]:
+        layer.trainable = False
+
+    variables = list({id(v): v for model in crop_models.values() for v in model.trainable_variables}.values())
+    optimizer = keras.optimizers.Adam(learning_rate=config["fine_tune_lr"])
+    loss_fn = keras.losses.CategoricalCrossentropy()
+    steps = max(len(train_gen) for train_gen, _, _ in generators.values())
+
+    best_accuracy = np.mean(list(validation_accuracy(crop_models, generators).values()))
+    best_weights = [backbone.get_weights()] + [head.get_weights() for head in heads.values()]
+    print(f"📊 Mean validation accuracy before fine-tuning: {best_accuracy:.4f}")
+
+    for epoch in range(config["fine_tune_epochs"]):
+        epoch_loss = 0.0
+        for step in range(steps):
+            with tf.GradientTape() as tape:
+                loss = 0.0
+                for crop_type, model in crop_models.items():
+                    x, y = next(generators[crop_type][0])
+                    loss += loss_fn(y, model(x, training=True)) + sum(model.losses)
+            grads = tape.gradient(loss, variables)
+            optimizer.apply_gradients(zip(grads, variables))
+            epoch_loss += float(loss)
+
+        accuracies = validation_accuracy(crop_models, generators)
+        mean_accuracy = np.mean(list(accuracies.values()))
+        print(f"🔬 Epoch {epoch + 1}/{config['fine_tune_epochs']} - loss {epoch_loss / steps:.4f} - "
+              f"val accuracy {mean_accuracy:.4f} {accuracies}")
+        if mean_accuracy > best_accuracy:
+            best_accuracy = mean_accuracy
+            best_weights = [backbone.get_weights()] + [head.get_weights() for head in heads.values()]
+
+    backbone.set_weights(best_weights[0])
+    for head, weights in zip(heads.values(), best_weights[1:]):
+        head.set_weights(weights)
+
+
+def train_model(crops, fine_tune=False):
+    """Main training function"""
+    print("=" * 60)
+    print("🌾🍵🌶️ Shared-Backbone Multi-Crop Disease Training")
+    print("=" * 60)
+
+    save_path = CONFIG["model_save_path"]
+    os.makedirs(save_path, exist_ok=True)
+
+    print("\n📁 Loading datasets...")
+    generators = {crop_type: create_data_generators(CONFIG["datasets"][crop_type], CONFIG) for crop_type in crops}
+
+    backbone = create_backbone(CONFIG)
+    feature_shape = backbone.output_shape[1:]
+    heads = {}
+    crop_models = {}
+    for crop_type in crops:
+        num_classes = len(generators[crop_type][0].class_indices)
+        heads[crop_type] = create_head(crop_type, num_classes, feature_shape)
+        crop_models[crop_type] = create_crop_model(crop_type, backbone, heads[crop_type], CONFIG)
+        print(f"📊 {crop_type.title()} classes ({num_classes}): {list(generators[crop_type][0].class_indices)}")
+
+    print("\n" + "=" * 60)
+    print("📚 Phase 1: Training Classification Heads")
+    print("=" * 60)
+    train_heads(crop_models, generators, CONFIG)
+
+    if fine_tune:
+        print("\n" + "=" * 60)
+        print("🔬 Phase 2: Joint Fine-tuning of the Shared Backbone")
+        print("=" * 60)
+        fine_tune_jointly(backbone, heads, crop_models, generators, CONFIG)
+
+    print("\n" + "=" * 60)
+    print("📊 Evaluating on Test Sets")
+    print("=" * 60)
+    report = {"fine_tuned": fine_tune, "crops": {}}
+    for crop_type, model in crop_models.items():
+        test_gen = generators[crop_type][2]
+        test_gen.reset()
+        predictions = model.predict(test_gen, verbose=0)
+        accuracy = float(np.mean(np.argmax(predictions, axis=1) == test_gen.classes))
+        report["crops"][crop_type] = {"test_accuracy": accuracy, "test_samples": test_gen.samples}
+        print(f"✅ {crop_type.title()} Test Accuracy: {accuracy*100:.2f}%")
+
+    # Backbone once, then a small head and class indices per crop
+    backbone.trainable = False
+    backbone.save(multicrop_paths(crops[0], save_path)["backbone"])
+    for crop_type in crops:
+        paths = multicrop_paths(crop_type, save_path)
+        heads[crop_type].save(paths["head"])
+        # Folder names use underscores (Blister_Blight) where disease_info uses spaces
+        class_idx_map = {
+            str(v): k.replace("_", " ")
+            for k, v in generators[crop_type][0].class_indices.items()
+        }
+        with open(paths["class_indices"], 'w') as f:
+            json.dump(class_idx_map, f, indent=2)
+        print(f"💾 Saved {crop_type} head to {paths['head']}")
+
+    with open(os.path.join(save_path, "multicrop_report.json"), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 60)
+    print("🎉 Training Complete!")
+    print(f"💾 Models saved to {save_path} (serve with SHARED_BACKBONE=true)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the shared-backbone multi-crop disease model")
+    parser.add_argument("--crops", nargs="+", default=list(CONFIG["datasets"]), choices=list(CONFIG["datasets"]))
+    parser.add_argument("--fine-tune", action="store_true", help="Jointly fine-tune the top backbone layers")
+    args = parser.parse_args()
+
+    gpus = tf.config.experimental.list_physical_devices('GPU')
+    if gpus:
+        for gpu in gpus:
+            tf.config.experimental.set_memory_growth(gpu, True)
+        print(f"🎮 GPU: {len(gpus)} device(s)")
+    else:
+        print("💻 Running on CPU")
+
+    train_model(args.crops, args.fine_tune)
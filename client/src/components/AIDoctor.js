@@ -149,7 +149,11 @@ const AIDoctor = ({ lang, user, onInteraction }) => {
       const response = await axios.post(
         `${API_BASE}/api/ai/predict/${cropType}`,
         formData,
-        { headers: { Authorization: `Bearer ${token}` } }
+        {
+          headers: { Authorization: `Bearer ${token}` },
+          // WebP Grad-CAM is a fraction of the size of base64 PNG
+          params: { gradcam_format: 'webp' }
+        }
       );
       const data = response.data;
 
@@ -561,7 +565,7 @@ const AIDoctor = ({ lang, user, onInteraction }) => {
                       <div className="text-center">
                         <p className="text-xs font-bold text-gray-500 mb-2">AI Focus</p>
                         <img
-                          src={`data:image/png;base64,${result.gradcam.overlay}`}
+                          src={`data:${result.gradcam.mime_type || 'image/png'};base64,${result.gradcam.overlay}`}
                           alt="Grad-CAM"
                           className="w-full h-36 object-cover rounded-xl shadow-md"
                         />
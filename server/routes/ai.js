@@ -25,6 +25,19 @@ const authMiddleware = async (req, res, next) => {
 
 const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://localhost:8000';
 
+// Query options the AI service understands for /predict (see prediction_options in ai-service/main.py)
+const PREDICT_OPTIONS = ['explain', 'gradcam_format', 'gradcam_quality', 'multipart', 'top_k'];
+const pickPredictOptions = (query) => Object.fromEntries(
+    PREDICT_OPTIONS.filter((key) => query[key] !== undefined).map((key) => [key, query[key]])
+);
+
+// Relay the AI service response as-is (JSON or multipart/mixed with binary Grad-CAM parts)
+const relay = (res, response) => {
+    res.status(response.status)
+        .set('Content-Type', response.headers['content-type'])
+        .send(Buffer.from(response.data));
+};
+
 /**
  * POST /api/ai/predict/:crop
  * AI Doctor endpoint - proxies file upload to Python AI service.
@@ -53,15 +66,21 @@ router.post('/predict/:crop', authMiddleware, checkCredits(25), upload.single('f
                     headers: {
                         ...formData.getHeaders()
                     },
+                    // explain=false skips Grad-CAM; fetch it later via /gradcam/:predictionId
+                    params: pickPredictOptions(req.query),
+                    responseType: 'arraybuffer',
                     timeout: 60000, // 60s timeout for large images / model inference
                     maxContentLength: Infinity,
                     maxBodyLength: Infinity
                 }
             );
 
-            res.json(response.data);
+            relay(res, response);
 
         } catch (proxyError) {
+            // The AI service answered with an error (413, 415, 400, ...): pass it on, never a mock diagnosis
+            if (proxyError.response) return relay(res, proxyError.response);
+
             // Fallback mock response when Python AI service is unreachable
             console.warn(`AI Service unreachable (${AI_SERVICE_URL}): ${proxyError.message}. Returning mock result.`);
 
@@ -89,4 +108,107 @@ router.post('/predict/:crop', authMiddleware, checkCredits(25), upload.single('f
     }
 });
 
+/**
+ * POST /api/ai/predict-batch/:crop
+ * Multi-image diagnosis for field visits - all leaves in one upload.
+ * Streams NDJSON results (one line per image) from the AI service.
+ * Cost: 25 credits per image.
+ */
+const MAX_BATCH_IMAGES = 50;
+router.post(
+    '/predict-batch/:crop',
+    authMiddleware,
+    upload.array('files', MAX_BATCH_IMAGES),
+    (req, res, next) => checkCredits(25 * Math.max(1, (req.files || []).length))(req, res, next),
+    async (req, res) => {
+        if (!req.files || req.files.length === 0) {
+            return res.status(400).json({ error: "No image files provided" });
+        }
+
+        try {
+            const formData = new FormData();
+            req.files.forEach((file) => {
+                formData.append('files', file.buffer, {
+                    filename: file.originalname,
+                    contentType: file.mimetype
+                });
+            });
+
+            const response = await axios.post(`${AI_SERVICE_URL}/predict/batch`, formData, {
+                headers: { ...formData.getHeaders() },
+                // /predict/batch takes top_k but no Grad-CAM options (fetched later per image)
+                params: { crop_type: req.params.crop, ...(req.query.top_k !== undefined && { top_k: req.query.top_k }) },
+                responseType: 'stream',
+                timeout: 300000,
+                maxContentLength: Infinity,
+                maxBodyLength: Infinity
+            });
+
+            res.status(response.status).set('Content-Type', response.headers['content-type']);
+            response.data.pipe(res);
+        } catch (err) {
+            console.error("AI Batch Route Error:", err.message);
+            res.status(err.response?.status || 502).json({ error: "AI Service Error" });
+        }
+    }
+);
+
+/**
+ * POST /api/ai/predict-field/:crop
+ * Field-level verdict (prevalence, confidence, severity) for many leaves from one plot.
+ * Cost: 25 credits per image.
+ */
+router.post(
+    '/predict-field/:crop',
+    authMiddleware,
+    upload.array('files', MAX_BATCH_IMAGES),
+    (req, res, next) => checkCredits(25 * Math.max(1, (req.files || []).length))(req, res, next),
+    async (req, res) => {
+        if (!req.files || req.files.length === 0) {
+            return res.status(400).json({ error: "No image files provided" });
+        }
+
+        try {
+            const formData = new FormData();
+            req.files.forEach((file) => {
+                formData.append('files', file.buffer, {
+                    filename: file.originalname,
+                    contentType: file.mimetype
+                });
+            });
+
+            const response = await axios.post(`${AI_SERVICE_URL}/predict/field`, formData, {
+                headers: { ...formData.getHeaders() },
+                params: { crop_type: req.params.crop },
+                responseType: 'arraybuffer',
+                timeout: 300000,
+                maxContentLength: Infinity,
+                maxBodyLength: Infinity
+            });
+            relay(res, response);
+        } catch (err) {
+            console.error("AI Field Route Error:", err.message);
+            if (err.response) return relay(res, err.response);
+            res.status(502).json({ error: "AI Service Error" });
+        }
+    }
+);
+
+/**
+ * GET /api/ai/gradcam/:predictionId
+ * Grad-CAM for a prediction made with explain=false (no extra credits).
+ */
+router.get('/gradcam/:predictionId', authMiddleware, async (req, res) => {
+    try {
+        const response = await axios.get(
+            `${AI_SERVICE_URL}/predict/${encodeURIComponent(req.params.predictionId)}/gradcam`,
+            { timeout: 60000, params: pickPredictOptions(req.query), responseType: 'arraybuffer' }
+        );
+        relay(res, response);
+    } catch (err) {
+        if (err.response) return relay(res, err.response);
+        res.status(502).json({ error: "AI Service Error" });
+    }
+});
+
 module.exports = router;